@@ -0,0 +1,99 @@
+"""
+Benchmark for fuzzy key lookup at 10, 1k and 100k keys per user.
+
+Compares difflib.get_close_matches over every stored key (the original
+find_closest_key) with the trigram FuzzyKeyIndex used by query_handler.py,
+both on its own (index.search) and end to end through retrieve_value, which
+is what a lookup actually costs (key cleaning, exact check, the per-user
+index lookup and the result formatting). The speed-up is difflib against
+retrieve_value. The index is built by the first retrieve_value of a user
+and kept up to date by remember_key/forget_key afterwards.
+
+Usage:
+    python Benchmarks/bench_fuzzy_keys.py [--sizes 10 1000 100000] [--lookups 200]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from difflib import get_close_matches
+
+nlp_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../NLP_Query_Processing"))
+sys.path.append(nlp_path)
+
+from fuzzy_keys import FuzzyKeyIndex
+from query_handler import retrieve_value
+
+RELATIONS = ["", "wife", "husband", "dad", "mom", "son", "daughter", "cousin", "boss", "friend"]
+NOUNS = ["passport", "phone", "birthday", "bank", "car", "insurance", "license", "email", "address", "ssn"]
+SUFFIXES = ["number", "date", "expiry", "pin", "plate", "policy", "code", "id", "account", "name"]
+
+
+def synthetic_keys(count, rng):
+    keys = set()
+    while len(keys) < count:
+        words = [rng.choice(RELATIONS), rng.choice(NOUNS), rng.choice(SUFFIXES), f"{rng.randrange(count):x}"]
+        keys.add(" ".join(word for word in words if word))
+    return list(keys)
+
+
+def typo(key, rng):
+    # Drop or swap one character to simulate a near miss
+    chars = list(key)
+    i = rng.randrange(len(chars) - 1)
+    if rng.random() < 0.5:
+        del chars[i]
+    else:
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return "".join(chars)
+
+
+def time_lookups(func, queries):
+    start = time.perf_counter()
+    for query in queries:
+        func(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--lookups", type=int, default=200, help="Lookups per size (difflib uses fewer at large sizes)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'keys':>8} {'index build':>12} {'difflib/lookup':>15} {'index/lookup':>13} "
+          f"{'retrieve/lookup':>16} {'speed-up':>9} {'agree':>6}")
+
+    for size in args.sizes:
+        keys = synthetic_keys(size, rng)
+        queries = [typo(rng.choice(keys), rng) for _ in range(args.lookups)]
+
+        start = time.perf_counter()
+        index = FuzzyKeyIndex(keys)
+        build = time.perf_counter() - start
+
+        # difflib is linear in the number of keys; keep its total run time bounded
+        difflib_queries = queries[:max(5, min(len(queries), 200000 // size))]
+        difflib_time = time_lookups(lambda q: get_close_matches(q, keys, n=1, cutoff=0.5), difflib_queries)
+        index_time = time_lookups(lambda q: index.search(q, k=1, cutoff=0.5), queries)
+
+        user = f"bench-{size}"
+        user_memory = {user: {key: ["value"] for key in keys}}
+        retrieve_value(user, queries[0], user_memory)  # builds the user's index, as the first lookup does
+        retrieve_time = time_lookups(lambda q: retrieve_value(user, q, user_memory), queries)
+
+        agree = sum(
+            (get_close_matches(q, keys, n=1, cutoff=0.5) or [None])[0] == (index.search(q)[:1] or [(None,)])[0][0]
+            for q in difflib_queries
+        ) / len(difflib_queries)
+
+        print(f"{size:>8} {build * 1e3:>10.1f}ms {difflib_time * 1e6:>13.1f}µs {index_time * 1e6:>11.1f}µs "
+              f"{retrieve_time * 1e6:>14.1f}µs {difflib_time / retrieve_time:>8.1f}x {agree:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark for detect_intent.
+
+Compares the original implementation (spaCy parse + one substring scan per
+keyword) with the precompiled single-pass matcher in crud_operations.py.
+The spaCy baseline is skipped when en_core_web_sm is not installed.
+
+Usage:
+    python Benchmarks/bench_intent.py [--number 20000]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+nlp_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../NLP_Query_Processing"))
+sys.path.append(nlp_path)
+
+from crud_operations import detect_intent, intent_keywords
+
+QUERIES = [
+    "@store my wife's passport number is X12345678",
+    "@store Dad's birthday is June 4th and mom's birthday is May 2nd",
+    "@update my car plate to AB-123",
+    "@delete my old phone number",
+    "what is my wife's passport number?",
+    "tell me my dad's birthday",
+    "my bank account number",
+    "show my cousin's phone number",
+]
+
+
+def legacy_detect_intent(query, nlp=None):
+    # Original implementation, kept here as the baseline
+    if nlp is not None:
+        nlp(query.lower())
+    for intent, keywords in intent_keywords.items():
+        if any(keyword in query for keyword in keywords):
+            return intent
+    return "retrieve_memory"
+
+
+def per_call_us(func, number):
+    def run():
+        for query in QUERIES:
+            func(query)
+
+    best = min(timeit.repeat(run, number=number, repeat=5))
+    return best / (number * len(QUERIES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="Loops over the query set per repeat")
+    args = parser.parse_args()
+
+    for query in QUERIES:
+        assert detect_intent(query) == legacy_detect_intent(query), query
+
+    results = [
+        ("legacy keyword loop (no spaCy)", per_call_us(legacy_detect_intent, args.number)),
+        ("compiled single-pass matcher", per_call_us(detect_intent, args.number)),
+    ]
+
+    try:
+        import spacy
+
+        nlp = spacy.load("en_core_web_sm")
+        results.insert(0, ("legacy spaCy + keyword loop", per_call_us(lambda q: legacy_detect_intent(q, nlp), max(1, args.number // 100))))
+    except (ImportError, OSError):
+        print("spaCy or en_core_web_sm not installed; skipping the spaCy baseline.\n")
+
+    for name, micros in results:
+        print(f"{name:<34} {micros:10.3f} µs/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+Open-loop load test for /chat with a latency and throughput gate.
+
+Requests arrive as a Poisson process at --rps, whether or not earlier ones
+have finished, so a slow server builds a queue instead of quietly slowing the
+generator down. The mix is synthetic (--mix store=0.2,retrieve=0.7,compound=0.1,
+see workload.py) or replayed from a JSONL file of {"user", "message"} lines.
+
+By default the Flask app runs in-process against a temporary local vector
+store and the hashing embedding stand-in (--real-model uses EMBEDDING_ENGINE).
+--url targets a running server instead, which must share JWT_SECRET with
+this process and be started with a RATE_LIMIT_MAX_REQUESTS high enough for
+the offered load; a run that gets any 429s measures the rate limiter, not
+latency, and fails.
+
+Every request reports:
+
+    latency       scheduled arrival → response (what a client sees)
+    client queue  scheduled arrival → a load generator thread sends it (time
+                  waiting for one of --concurrency client threads; queueing
+                  inside the server is part of service)
+    service       request sent → response
+
+The run fails (exit status 1) if p99 latency, throughput or the error rate
+break their budgets, so it can gate a release:
+
+    python Benchmarks/load_test.py --rps 200 --duration 30 --max-p99-ms 50 --min-throughput 190
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# The in-process app must not rate-limit the generated load. Set before the
+# app and its limiter are imported; a --url server needs its own setting.
+os.environ.setdefault("RATE_LIMIT_MAX_REQUESTS", "1000000000")
+
+from run_benchmarks import BENCH_DIR, git_commit, print_table
+from stand_ins import install_stand_ins
+from workload import Workload
+
+DEFAULT_MIX = "store=0.2,retrieve=0.7,compound=0.1"
+
+
+def parse_mix(text):
+    """
+    Parses "store=0.2,retrieve=0.7,compound=0.1" into normalised weights.
+    """
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in ("store", "retrieve", "compound"):
+            raise ValueError(f"Unknown request kind '{kind}' in --mix. Use store, retrieve and compound.")
+        mix[kind] = float(weight)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("--mix weights must add up to more than 0")
+    return {kind: weight / total for kind, weight in mix.items()}
+
+
+def synthetic_requests(workload, mix, count, rng):
+    """
+    Returns `count` (kind, user, message) requests drawn from `mix`.
+    """
+    kinds, weights = list(mix), list(mix.values())
+    requests = []
+    for _ in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        user = rng.choice(workload.users)
+        if kind == "store":
+            message = workload.store_message(user, rng.choice(workload.keys))
+        elif kind == "retrieve":
+            message = workload.retrieve_message(workload.keys[rng.randrange(len(workload.keys))])
+        else:
+            message = workload.compound_message(rng.randint(2, 4))
+        requests.append((kind, user, message))
+    return requests
+
+
+def replayed_requests(path, count):
+    """
+    Returns up to `count` (kind, user, message) requests from a JSONL recording, cycling if it is shorter.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records:
+        raise ValueError(f"{path} has no requests")
+    return [
+        (record.get("kind", "replay"), record["user"], record["message"])
+        for record in (records[i % len(records)] for i in range(count))
+    ]
+
+
+class InProcessTarget:
+    """
+    Sends /chat requests through the Flask test client (one client per thread).
+    """
+
+    def __init__(self):
+        import app_embeddings
+
+        self.app = app_embeddings.app
+        self._local = threading.local()
+
+    def send(self, token, message):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client.post("/chat", json={"message": message}, headers={"Authorization": f"Bearer {token}"}).status_code
+
+
+class HttpTarget:
+    """
+    Sends /chat requests to a running server.
+    """
+
+    def __init__(self, url, timeout=30.0):
+        self.url = url.rstrip("/") + "/chat"
+        self.timeout = timeout
+
+    def send(self, token, message):
+        request = urllib.request.Request(
+            self.url, data=json.dumps({"message": message}).encode(), method="POST",
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {token}"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except OSError:
+            return 0  # Connection refused, reset or timed out
+
+
+def latency_stats(samples):
+    """
+    Returns count and latency percentiles (ms) for samples in seconds.
+    """
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e3
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1e3,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1] * 1e3,
+    }
+
+
+def drive(target, tokens, requests, rps, concurrency, seed):
+    """
+    Sends `requests` at Poisson arrival times with mean rate `rps`.
+
+    Returns:
+        tuple: (one dict per request, seconds from the start to the last response,
+        the latest the generator dispatched a request, in seconds)
+    """
+    rng = random.Random(seed)
+    outcomes = [None] * len(requests)
+
+    def send(i, scheduled):
+        kind, user, message = requests[i]
+        started = time.perf_counter()
+        try:
+            status = target.send(tokens[user], message)
+        except Exception:
+            status = 0
+        finished = time.perf_counter()
+        outcomes[i] = {"kind": kind, "status": status, "scheduled": scheduled, "started": started, "finished": finished}
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load") as executor:
+        begin = time.perf_counter()
+        arrival = begin
+        dispatch_lag = 0.0
+        for i in range(len(requests)):
+            arrival += rng.expovariate(rps)
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            dispatch_lag = max(dispatch_lag, time.perf_counter() - arrival)
+            # Timed from the scheduled arrival, so a late dispatch counts as client queueing
+            executor.submit(send, i, arrival)
+    elapsed = max(outcome["finished"] for outcome in outcomes) - begin
+    return outcomes, elapsed, dispatch_lag
+
+
+def summarise(outcomes, elapsed, offered_rps):
+    ok = [o for o in outcomes if 200 <= o["status"] < 300]
+    report = {
+        "requests": len(outcomes),
+        "offered_rps": offered_rps,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "error_rate": 1 - len(ok) / len(outcomes) if outcomes else 0.0,
+        "errors_by_status": {},
+        "latency": latency_stats([o["finished"] - o["scheduled"] for o in outcomes]),
+        "client_queue": latency_stats([max(0.0, o["started"] - o["scheduled"]) for o in outcomes]),
+        "service": latency_stats([o["finished"] - o["started"] for o in outcomes]),
+        "by_kind": {},
+    }
+    for outcome in outcomes:
+        if not 200 <= outcome["status"] < 300:
+            status = str(outcome["status"])
+            report["errors_by_status"][status] = report["errors_by_status"].get(status, 0) + 1
+    for kind in sorted({o["kind"] for o in outcomes}):
+        report["by_kind"][kind] = latency_stats([o["finished"] - o["scheduled"] for o in outcomes if o["kind"] == kind])
+    return report
+
+
+def check_budgets(report, args):
+    """
+    Returns a message for every budget the run broke.
+    """
+    failures = []
+    p99 = report["latency"].get("p99_ms", 0.0)
+    if args.max_p99_ms is not None and p99 > args.max_p99_ms:
+        failures.append(f"p99 latency {p99:.1f} ms > {args.max_p99_ms} ms")
+    if args.min_throughput is not None and report["throughput_rps"] < args.min_throughput:
+        failures.append(f"throughput {report['throughput_rps']:.1f} req/s < {args.min_throughput} req/s")
+    if report["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {report['error_rate']:.2%} > {args.max_error_rate:.2%}")
+    limited = report["errors_by_status"].get("429", 0)
+    if limited:
+        where = "the server's RATE_LIMIT_MAX_REQUESTS" if args.url else "RATE_LIMIT_MAX_REQUESTS"
+        failures.append(f"{limited} requests were rate limited (429); raise {where} so the run measures latency")
+    return failures
+
+
+def run(args):
+    in_process = not args.url
+    if in_process:
+        install_stand_ins(fake_model=not args.real_model, latency_ms=args.index_latency_ms, model_cost_ms=args.model_cost_ms)
+
+    # Imported after the stand-ins are installed and the environment is set
+    from restrict_search import generate_token
+    from tracing import metrics
+
+    target = InProcessTarget() if in_process else HttpTarget(args.url, args.timeout)
+    workload = Workload(args.users, args.facts, args.zipf, args.seed)
+    tokens = {user: generate_token(user) for user in workload.users}
+    rng = random.Random(args.seed)
+
+    if not args.no_seed:
+        # Store every fact first so retrievals have something to find; not measured
+        failed = sum(target.send(tokens[user], message) != 200 for user, message in workload.store_requests())
+        if failed:
+            raise SystemExit(f"❌ {failed} seed requests failed; is the server up and JWT_SECRET shared?")
+
+    count = max(1, int(args.rps * args.duration))
+    if args.replay:
+        requests = replayed_requests(args.replay, count)
+    else:
+        requests = synthetic_requests(workload, parse_mix(args.mix), count, rng)
+    for _, user, _ in requests:
+        if user not in tokens:
+            tokens[user] = generate_token(user)  # Replayed users outside the workload
+
+    metrics.reset()
+    outcomes, elapsed, dispatch_lag = drive(target, tokens, requests, args.rps, args.concurrency, args.seed)
+    report = summarise(outcomes, elapsed, args.rps)
+    report["dispatch_lag_ms"] = dispatch_lag * 1e3
+    if in_process:
+        report["stages"] = metrics.snapshot()
+    return report
+
+
+def print_report(report):
+    errors = f" by status: {report['errors_by_status']}" if report["errors_by_status"] else ""
+    print(f"\nOffered {report['offered_rps']:.1f} req/s, served {report['throughput_rps']:.1f} req/s "
+          f"({report['requests']} requests, {report['error_rate']:.2%} errors{errors})")
+    print(f"\n  {'':<12} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    rows = [("latency", report["latency"]), ("client queue", report["client_queue"]), ("service", report["service"])]
+    rows += [(f"  {kind}", stats) for kind, stats in report["by_kind"].items()]
+    for name, stats in rows:
+        if stats.get("count"):
+            print(f"  {name:<12} {stats['count']:>7} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                  f"{stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f}")
+    if report["dispatch_lag_ms"] > 10:
+        print(f"\n⚠️ The generator dispatched up to {report['dispatch_lag_ms']:.1f} ms late; results understate the offered load.")
+    if report.get("stages"):
+        print_table("/chat stages", report["stages"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rps", type=float, default=100.0, help="Mean arrival rate (requests per second)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of arrivals to generate")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight at most (client threads)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Synthetic request mix")
+    parser.add_argument("--replay", default=None, help="JSONL file of {\"user\", \"message\"} requests to replay")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--facts", type=int, default=20, help="Facts per user")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent for key popularity")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-seed", action="store_true", help="Skip storing the workload's facts before the run")
+    parser.add_argument("--url", default=None, help="Target a running server (e.g. http://localhost:5000)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout with --url")
+    parser.add_argument("--index-latency-ms", type=float, default=0.0, help="Simulated round trip per index call")
+    parser.add_argument("--model-cost-ms", type=float, default=0.0, help="Simulated compute per stand-in encode")
+    parser.add_argument("--real-model", action="store_true", help="Use the configured embedding engine (EMBEDDING_ENGINE)")
+    parser.add_argument("--max-p99-ms", type=float, default=None, help="Fail if p99 latency is higher")
+    parser.add_argument("--min-throughput", type=float, default=None, help="Fail if fewer successful req/s are served")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Fail if more requests fail")
+    parser.add_argument("--output", default=None, help="JSON results path (default: Benchmarks/results/load-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    report = run(args)
+    failures = check_budgets(report, args)
+    print_report(report)
+
+    meta = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "target": args.url or "in-process",
+        "embedding_engine": os.getenv("EMBEDDING_ENGINE", "sentence-transformers") if args.real_model or args.url else "hashing stand-in",
+    }
+    output = args.output or os.path.join(BENCH_DIR, "results", f"load-{meta['commit'] or 'local'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": report, "failures": failures}, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if failures:
+        print("\n❌ Budgets broken:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\n✅ Within budgets")
+
+
+if __name__ == "__main__":
+    main()
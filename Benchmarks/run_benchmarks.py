@@ -0,0 +1,204 @@
+"""
+Reproducible end-to-end benchmark suite.
+
+Runs a synthetic workload (see workload.py) against the local vector store in
+a temporary directory (see stand_ins.py), then measures:
+
+    - individual functions: preprocess_query, extract_key_value, embed_text,
+      store_text, search_text
+    - the /chat store and retrieve flow through the Flask test client, with
+      the per-stage histograms from Monitoring/tracing.py
+
+It reports throughput and p50/p95/p99 and writes everything to a JSON file so
+results can be compared between commits:
+
+    python Benchmarks/run_benchmarks.py --output before.json
+    ... change code ...
+    python Benchmarks/run_benchmarks.py --output after.json --compare before.json
+
+The hashing embedding stand-in is used unless --real-model is given.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# Benchmarks must not trip the per-user rate limiter
+os.environ.setdefault("RATE_LIMIT_MAX_REQUESTS", "1000000000")
+# Per-request INFO logs would dominate the timings
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+for relative in ("../Setting_up_LLM", "../Connecting_LLM_VectorDB", "../NLP_Query_Processing", "../LLM_Security", "../Monitoring"):
+    sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, relative)))
+
+from stand_ins import install_stand_ins
+from workload import Workload
+
+
+def percentiles(samples):
+    """
+    Returns count, throughput and latency percentiles (ms) for per-call samples in seconds.
+    """
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e3
+
+    total = sum(ordered)
+    return {
+        "count": len(ordered),
+        "throughput_per_s": len(ordered) / total if total else 0.0,
+        "mean_ms": total / len(ordered) * 1e3,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+    }
+
+
+def measure(func, calls):
+    samples = []
+    for args in calls:
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    install_stand_ins(fake_model=not args.real_model, latency_ms=args.index_latency_ms)
+
+    # Imported after the stand-ins are installed and the environment is set
+    from nlp_processing import preprocess_query, extract_key_value
+    from vectordb import embed_text, store_text, search_text
+    from tracing import metrics
+    from restrict_search import generate_token
+    import app_embeddings
+
+    workload = Workload(args.users, args.facts, args.zipf, args.seed)
+    retrievals = list(workload.retrieve_requests(args.retrievals))
+    store_messages = list(workload.store_requests())
+    results = {"functions": {}, "chat": {}}
+
+    # Individual functions
+    results["functions"]["preprocess_query"] = measure(preprocess_query, [(m,) for _, m, _ in retrievals])
+    results["functions"]["extract_key_value"] = measure(extract_key_value, [(m,) for _, m in store_messages])
+    results["functions"]["embed_text"] = measure(embed_text, [(preprocess_query(m),) for _, m, _ in retrievals])
+
+    function_user = "bench_function_user"
+    facts = workload.facts(workload.users[0])
+    results["functions"]["store_text"] = measure(store_text, [(function_user, k, v, r) for k, v, r in facts])
+    results["functions"]["search_text"] = measure(
+        search_text, [(function_user, f"{r} {k}" if r else k) for k, _, r in facts]
+    )
+
+    # End-to-end /chat flow
+    metrics.reset()
+    client = app_embeddings.app.test_client()
+
+    tokens = {user: generate_token(user) for user in workload.users}
+
+    def chat(user, message):
+        response = client.post("/chat", json={"message": message}, headers={"Authorization": f"Bearer {tokens[user]}"})
+        if response.status_code != 200:
+            raise RuntimeError(f"/chat returned {response.status_code}: {response.get_json()}")
+        return response.get_json()
+
+    results["chat"]["store"] = measure(chat, store_messages)
+
+    correct = 0
+    samples = []
+    for user, message, expected in retrievals:
+        start = time.perf_counter()
+        reply = chat(user, message)
+        samples.append(time.perf_counter() - start)
+        correct += expected in reply.get("response", "")
+    results["chat"]["retrieve"] = percentiles(samples)
+    results["chat"]["retrieve"]["accuracy"] = correct / len(retrievals) if retrievals else 0.0
+    results["stages"] = metrics.snapshot()
+
+    return results
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"  {'name':<22} {'count':>7} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in rows.items():
+        if not stats.get("count"):
+            continue
+        throughput = stats.get("throughput_per_s")
+        throughput = f"{throughput:>10.0f}" if throughput is not None else f"{'-':>10}"
+        print(f"  {name:<22} {stats['count']:>7} {throughput} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f}")
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    print(f"\nChange in p99 vs {baseline_path} (commit {baseline.get('meta', {}).get('commit')}):")
+    for section in ("functions", "chat", "stages"):
+        for name, stats in current["results"].get(section, {}).items():
+            before = baseline.get("results", {}).get(section, {}).get(name)
+            if not before or not before.get("p99_ms") or "p99_ms" not in stats:
+                continue
+            delta = (stats["p99_ms"] - before["p99_ms"]) / before["p99_ms"] * 100
+            label = f"{section}/{name}"
+            print(f"  {label:<32} {before['p99_ms']:>9.3f} → {stats['p99_ms']:>9.3f} ms ({delta:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--facts", type=int, default=50, help="Facts per user")
+    parser.add_argument("--retrievals", type=int, default=2000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent for key popularity")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--index-latency-ms", type=float, default=0.0, help="Simulated round trip per index call")
+    parser.add_argument("--real-model", action="store_true", help="Use the configured embedding engine (EMBEDDING_ENGINE)")
+    parser.add_argument("--output", default=None, help="JSON results path (default: Benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to compare p99 against")
+    args = parser.parse_args()
+
+    results = run(args)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": vars(args),
+            "embedding_engine": os.getenv("EMBEDDING_ENGINE", "sentence-transformers") if args.real_model else "hashing stand-in",
+        },
+        "results": results,
+    }
+
+    print_table("Functions", results["functions"])
+    print_table("/chat", results["chat"])
+    print_table("/chat stages", results["stages"])
+    print(f"\nRetrieval accuracy: {results['chat']['retrieve'].get('accuracy', 0):.1%}")
+
+    output = args.output or os.path.join(BENCH_DIR, "results", f"{report['meta']['commit'] or 'local'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Local stand-ins for the external services, used by the benchmarks and the
+load test so they run offline and reproducibly.
+
+    RemoteLikeVectorStore  LocalVectorStore in a temporary directory, with an
+                           optional per-call delay standing in for the
+                           network round trip to a hosted index
+    HashingEmbeddingModel  deterministic bag-of-words embeddings (no torch)
+
+The vector store is the production local backend, so benchmarks exercise its
+filtering, relation partitions and async executor path. `install_stand_ins()`
+swaps both into model_registry.
+"""
+
+import atexit
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+vectordb_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../Connecting_LLM_VectorDB"))
+sys.path.append(vectordb_path)
+
+import model_registry
+from vector_store import LocalVectorStore
+
+
+class RemoteLikeVectorStore(LocalVectorStore):
+    """
+    LocalVectorStore in a fresh temporary directory (removed at exit).
+    `latency_ms` adds a fixed sleep to every upsert, query and delete to
+    mimic a network round trip; the async methods run them in the executor.
+    """
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000.0
+        directory = tempfile.mkdtemp(prefix="bench-vectors-")
+        atexit.register(shutil.rmtree, directory, True)
+        super().__init__(directory)
+
+    def _sleep(self):
+        if self.latency:
+            threading.Event().wait(self.latency)
+
+    def upsert(self, vectors, namespace=""):
+        self._sleep()
+        return super().upsert(vectors, namespace)
+
+    def query(self, vector, top_k=1, include_metadata=True, namespace="", filter=None):
+        self._sleep()
+        return super().query(vector, top_k, include_metadata, namespace, filter)
+
+    def delete(self, ids, namespace=""):
+        self._sleep()
+        return super().delete(ids, namespace)
+
+
+class HashingEmbeddingModel:
+    """
+    Deterministic stand-in for SentenceTransformer.encode: each word is hashed
+    into one of `dimension` buckets. Similar keys share words, so nearest
+    neighbours behave plausibly. `cost_ms` adds a per-call busy wait to
+    mimic model compute.
+    """
+
+    def __init__(self, dimension=384, cost_ms=0.0):
+        self.dimension = dimension
+        self.cost = cost_ms / 1000.0
+
+    def _vector(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dimension] += 1.0
+        return vector
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        if self.cost:
+            threading.Event().wait(self.cost)
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return np.stack([self._vector(text) for text in texts]) if texts else np.zeros((0, self.dimension), dtype=np.float32)
+
+
+def install_stand_ins(fake_model=True, latency_ms=0.0, model_cost_ms=0.0):
+    """
+    Points model_registry at a RemoteLikeVectorStore and, optionally, the
+    hashing embedding model.
+
+    Returns:
+        RemoteLikeVectorStore: The installed store.
+    """
+    store = RemoteLikeVectorStore(latency_ms)
+    model_registry.set_vector_store(store)
+    if fake_model:
+        model_registry.set_embedding_model(HashingEmbeddingModel(cost_ms=model_cost_ms))
+    return store
@@ -0,0 +1,98 @@
+"""
+Synthetic workload generator for the benchmarks and the load test.
+
+N users each store M facts. Retrievals pick keys with Zipfian popularity
+(a few keys such as "passport number" are asked for constantly), which is
+what the caches and indexes are meant to exploit.
+"""
+
+import random
+
+RELATIONS = [None, "wife", "husband", "dad", "mom", "son", "daughter", "cousin", "boss", "friend"]
+SUBJECTS = ["passport", "phone", "birthday", "bank", "car", "insurance", "license", "email", "address", "ssn",
+            "gym", "doctor", "wifi", "locker", "library", "flight", "hotel", "school", "office", "dentist"]
+ATTRIBUTES = ["number", "date", "expiry", "pin", "plate", "policy", "code", "id", "account", "name"]
+
+
+class Workload:
+    """
+    Deterministic synthetic users, facts and requests.
+
+    Args:
+        users (int): Number of users.
+        facts_per_user (int): Facts stored per user.
+        zipf_s (float): Zipf exponent for key popularity (higher = more skewed).
+        seed (int): Random seed, so runs are comparable across commits.
+    """
+
+    def __init__(self, users=20, facts_per_user=50, zipf_s=1.1, seed=42):
+        self.rng = random.Random(seed)
+        self.users = [f"bench_user_{i}" for i in range(users)]
+
+        keys = [(relation, f"{subject} {attribute}") for subject in SUBJECTS for attribute in ATTRIBUTES for relation in RELATIONS]
+        self.rng.shuffle(keys)
+        if facts_per_user > len(keys):
+            raise ValueError(f"facts_per_user must be at most {len(keys)}")
+        self.keys = keys[:facts_per_user]
+
+        weights = [1.0 / (rank + 1) ** zipf_s for rank in range(len(self.keys))]
+        total = sum(weights)
+        self.cumulative = []
+        running = 0.0
+        for weight in weights:
+            running += weight / total
+            self.cumulative.append(running)
+
+        self.values = {
+            (user, key): f"V{self.rng.randrange(10 ** 8):08d}" for user in self.users for key in self.keys
+        }
+
+    def _zipf_key(self):
+        point = self.rng.random()
+        low, high = 0, len(self.cumulative) - 1
+        while low < high:
+            mid = (low + high) // 2
+            if self.cumulative[mid] < point:
+                low = mid + 1
+            else:
+                high = mid
+        return self.keys[low]
+
+    @staticmethod
+    def _phrase(relation, key):
+        return f"my {relation}'s {key}" if relation else f"my {key}"
+
+    def store_message(self, user, key):
+        relation, name = key
+        return f"@store {self._phrase(relation, name)} is {self.values[(user, key)]}"
+
+    def retrieve_message(self, key):
+        relation, name = key
+        return f"tell me {self._phrase(relation, name)}"
+
+    def compound_message(self, count=2):
+        keys = [self._zipf_key() for _ in range(count)]
+        return "tell me " + " and ".join(self._phrase(relation, name) for relation, name in keys)
+
+    def store_requests(self):
+        """
+        Yields (user, message) for every fact of every user.
+        """
+        for user in self.users:
+            for key in self.keys:
+                yield user, self.store_message(user, key)
+
+    def facts(self, user):
+        """
+        Returns (key, value, relation) triples for store_text/store_many.
+        """
+        return [(name, self.values[(user, (relation, name))], relation) for relation, name in self.keys]
+
+    def retrieve_requests(self, count):
+        """
+        Yields (user, message, expected value) with Zipfian key popularity.
+        """
+        for _ in range(count):
+            user = self.rng.choice(self.users)
+            key = self._zipf_key()
+            yield user, self.retrieve_message(key), self.values[(user, key)]
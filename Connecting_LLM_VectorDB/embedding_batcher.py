@@ -0,0 +1,108 @@
+"""
+Micro-batching scheduler for embedding requests.
+
+Concurrent /chat requests each need one embedding. Instead of running many
+batch-of-1 forward passes, callers hand their text to a single worker thread
+which collects requests for up to `max_wait_ms` (or until `max_batch_size`
+texts are queued) and encodes them with one `model.encode` call.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+
+class EmbeddingBatcher:
+    """
+    Collects texts from many threads and encodes them in batches.
+
+    Args:
+        encode (callable): Takes a list of texts and returns one vector per text.
+        max_batch_size (int): Largest number of texts encoded in one call.
+        max_wait_ms (float): How long the first text of a batch may wait for company.
+    """
+
+    def __init__(self, encode, max_batch_size=32, max_wait_ms=5):
+        self._encode = encode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        # The worker is started on first use so forked processes get their own
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, text):
+        """
+        Queues a text and returns a Future resolving to its embedding.
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text, timeout=None):
+        """
+        Embeds a single text, blocking until its batch has been encoded.
+        """
+        return self.submit(text).result(timeout)
+
+    def embed_many(self, texts, timeout=None):
+        """
+        Embeds several texts; they are queued together so they share batches.
+        """
+        futures = [self.submit(text) for text in texts]
+        return [future.result(timeout) for future in futures]
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    @staticmethod
+    def _resolve(future, result=None, error=None):
+        # One misbehaving future must not take the worker thread down with it
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def _run(self):
+        while True:
+            # Callers that gave up (e.g. a cancelled async request) are skipped
+            batch = [(text, future) for text, future in self._collect_batch() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            # Identical texts in the same batch are encoded once
+            unique_texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(unique_texts, self._encode(unique_texts)))
+            except Exception as e:
+                for _, future in batch:
+                    self._resolve(future, error=e)
+                continue
+
+            for text, future in batch:
+                self._resolve(future, vectors[text])
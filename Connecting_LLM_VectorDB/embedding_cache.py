@@ -0,0 +1,161 @@
+"""
+Bounded cache for text embeddings.
+
+Retrieval keys such as "wife passport number" repeat constantly, so the
+embedding for a given (model, text) pair is computed once and reused. There
+are two tiers:
+
+    - an in-memory LRU holding up to `max_entries` vectors
+    - an optional sqlite file that survives restarts (EMBEDDING_CACHE_PATH),
+      written in batches off the lookup path
+"""
+
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+
+def normalize_cache_text(text):
+    """
+    Collapses whitespace so trivially different spellings share one entry.
+    """
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    LRU embedding cache with an optional persistent sqlite tier.
+
+    The memory tier has its own lock and never waits on disk I/O. New
+    vectors are written to disk in batches of `commit_every` (or once
+    `commit_interval` seconds have passed, or on flush()), each batch in one
+    transaction.
+    """
+
+    def __init__(self, max_entries=10000, path=None, commit_every=64, commit_interval=1.0):
+        self.max_entries = max_entries
+        self.path = path
+        self.commit_every = max(1, commit_every)
+        self.commit_interval = commit_interval
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._unwritten = {}  # key -> vector bytes waiting for the next disk batch
+        self._last_commit = time.monotonic()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, text))"
+            )
+            self._db.commit()
+
+    def _remember(self, key, vector):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, model_id, text):
+        """
+        Returns the cached embedding as a list of floats, or None on a miss.
+        """
+        key = (model_id, normalize_cache_text(text))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector.tolist()
+            raw = self._unwritten.get(key)
+
+        if raw is None and self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND text = ?", key
+                ).fetchone()
+            raw = row[0] if row is not None else None
+
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            vector = array("f")
+            vector.frombytes(raw)
+            self._remember(key, vector)
+            self.disk_hits += 1
+            return vector.tolist()
+
+    def put(self, model_id, text, embedding):
+        """
+        Stores an embedding in memory and, when configured, queues it for disk.
+        """
+        self.put_many(model_id, [(text, embedding)])
+
+    def put_many(self, model_id, items):
+        """
+        Stores several (text, embedding) pairs. At most `max_entries` are kept
+        in memory, and they go to disk together.
+        """
+        with self._lock:
+            for text, embedding in items:
+                key = (model_id, normalize_cache_text(text))
+                vector = array("f", embedding)
+                self._remember(key, vector)
+                if self._db is not None:
+                    self._unwritten[key] = vector.tobytes()
+            due = len(self._unwritten) >= self.commit_every or (
+                self._unwritten and time.monotonic() - self._last_commit >= self.commit_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the queued vectors to the disk tier in one transaction.
+        """
+        if self._db is None:
+            return 0
+        with self._db_lock:
+            with self._lock:
+                unwritten, self._unwritten = self._unwritten, {}
+                self._last_commit = time.monotonic()
+            if unwritten:
+                with self._db:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO embeddings (model, text, vector) VALUES (?, ?, ?)",
+                        [(model, text, raw) for (model, text), raw in unwritten.items()],
+                    )
+        return len(unwritten)
+
+    def stats(self):
+        """
+        Returns hit/miss counters and the current size of the memory tier.
+        """
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "persistent": self._db is not None,
+            }
+
+    def clear(self):
+        """
+        Drops the memory tier and resets the counters (the disk tier is kept).
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
@@ -0,0 +1,226 @@
+"""
+Embedding engines for CPU inference, selected with EMBEDDING_ENGINE:
+
+    sentence-transformers  the reference PyTorch model (default)
+    onnx                   the same model exported to ONNX, run with ONNX Runtime
+    onnx-int8              the ONNX model with dynamically int8-quantized weights
+
+Every engine has the `encode(texts, batch_size=...)` method the batcher
+uses, returning one L2-normalised float32 row per text. The ONNX files are
+exported from the reference model on first use into ONNX_MODEL_DIR (default
+Connecting_LLM_VectorDB/.onnx/<model>). Do that at build time with:
+
+    python Connecting_LLM_VectorDB/embedding_engines.py --export
+
+Quantization trades a little accuracy for speed, so check an engine against
+the reference model on the keys you actually store before switching:
+
+    python Connecting_LLM_VectorDB/embedding_engines.py --parity --engine onnx-int8 --keys keys.txt
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+
+import numpy as np
+
+ENGINES = ("sentence-transformers", "onnx", "onnx-int8")
+DEFAULT_ONNX_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".onnx"))
+ONNX_MAX_LENGTH = int(os.getenv("ONNX_MAX_LENGTH", "256"))
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))  # 0 lets ONNX Runtime decide
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+
+logger = logging.getLogger(__name__)
+
+
+def onnx_model_dir(model_name):
+    """
+    Returns where the ONNX export of `model_name` is kept.
+    """
+    default = os.path.join(DEFAULT_ONNX_ROOT, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+    return os.getenv("ONNX_MODEL_DIR", default)
+
+
+def export_onnx(model_name, output_dir, quantize=True):
+    """
+    Exports the transformer of `model_name` to ONNX (and an int8 copy) with its tokenizer.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    model_path = os.path.join(output_dir, MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    tokenizer.save_pretrained(output_dir)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(model_path, os.path.join(output_dir, QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+    logger.info("Exported %s to %s", model_name, output_dir)
+
+
+class OnnxEmbeddingEngine:
+    """
+    Sentence embeddings from an ONNX export: tokenizer, ONNX Runtime forward
+    pass, then the same mean pooling and normalisation as the reference model.
+
+    Args:
+        model_name (str): Reference model (used to export when files are missing).
+        quantized (bool): Use the int8 model.
+        model_dir (str): Directory with the exported model and tokenizer.
+        intra_op_threads (int): ONNX Runtime intra-op threads (default: ONNX_INTRA_OP_THREADS).
+    """
+
+    def __init__(self, model_name, quantized=False, model_dir=None, intra_op_threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_dir = model_dir or onnx_model_dir(model_name)
+        model_path = os.path.join(self.model_dir, QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+        if not os.path.exists(model_path):
+            logger.warning("⚠️ No ONNX model at %s, exporting %s (do this at build time).", model_path, model_name)
+            export_onnx(model_name, self.model_dir, quantize=quantized)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = ONNX_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        if isinstance(texts, str):
+            return self.encode([texts], batch_size)[0]
+
+        batches = []
+        for start in range(0, len(texts), max(1, batch_size)):
+            tokens = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True,
+                max_length=ONNX_MAX_LENGTH, return_tensors="np",
+            )
+            feed = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+            hidden = self.session.run(None, feed)[0]
+
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            batches.append(pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12))
+        if not batches:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.concatenate(batches).astype(np.float32)
+
+
+def create_embedding_model(model_name, engine=None, threads=None):
+    """
+    Builds the engine selected by EMBEDDING_ENGINE (or `engine`). `threads`
+    sets the ONNX engines' intra-op thread count (torch is set process-wide).
+    """
+    engine = (engine or os.getenv("EMBEDDING_ENGINE", "sentence-transformers")).strip().lower()
+    if engine == "sentence-transformers":
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(model_name)
+    if engine == "onnx":
+        return OnnxEmbeddingEngine(model_name, intra_op_threads=threads)
+    if engine == "onnx-int8":
+        return OnnxEmbeddingEngine(model_name, quantized=True, intra_op_threads=threads)
+    raise ValueError(f"Unknown embedding engine '{engine}'. Use one of: {', '.join(ENGINES)}.")
+
+
+def check_parity(candidate, reference, texts, batch_size=64):
+    """
+    Compares two engines on `texts`.
+
+    Returns:
+        dict: mean/min/p01 cosine similarity between the engines' embeddings of
+        the same text, and how often each text's nearest other text agrees.
+    """
+    a = np.asarray(candidate.encode(texts, batch_size=batch_size), dtype=np.float32)
+    b = np.asarray(reference.encode(texts, batch_size=batch_size), dtype=np.float32)
+    a /= np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b /= np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+
+    cosine = (a * b).sum(axis=1)
+    report = {
+        "texts": len(texts),
+        "mean_cosine": float(cosine.mean()),
+        "min_cosine": float(cosine.min()),
+        "p01_cosine": float(np.percentile(cosine, 1)),
+    }
+    if len(texts) > 1:
+        # Retrieval agreement: does each key's nearest neighbour stay the same?
+        sim_a, sim_b = a @ a.T, b @ b.T
+        np.fill_diagonal(sim_a, -np.inf)
+        np.fill_diagonal(sim_b, -np.inf)
+        report["neighbour_agreement"] = float((sim_a.argmax(axis=1) == sim_b.argmax(axis=1)).mean())
+    return report
+
+
+def _load_keys(path=None, store_dir=None):
+    """
+    Reads keys to compare on: a text file (one per line), a JSONL import file
+    ({"key": ...}), or the metadata of a local vector store.
+    """
+    keys = []
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("{"):
+                    line = json.loads(line).get("key", "")
+                if line:
+                    keys.append(line)
+    else:
+        for sidecar in glob.glob(os.path.join(store_dir, "*.json")):
+            with open(sidecar, "r", encoding="utf-8") as f:
+                keys.extend(m["key"] for m in json.load(f).get("metadata", []) if m.get("key"))
+    return list(dict.fromkeys(keys))
+
+
+if __name__ == "__main__":
+    from vector_store import DEFAULT_LOCAL_DIR
+
+    model_name = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+    parser = argparse.ArgumentParser(description="Export ONNX embedding engines or check their parity.")
+    parser.add_argument("--export", action="store_true", help=f"export {model_name} to {onnx_model_dir(model_name)}")
+    parser.add_argument("--parity", action="store_true", help="compare an engine with the reference model")
+    parser.add_argument("--engine", default="onnx-int8", choices=ENGINES)
+    parser.add_argument("--keys", help="keys to compare on (default: keys in the local vector store)")
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="fail if the mean cosine is lower")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.export:
+        export_onnx(model_name, onnx_model_dir(model_name))
+    if args.parity:
+        keys = _load_keys(args.keys, os.getenv("LOCAL_VECTOR_STORE_DIR", DEFAULT_LOCAL_DIR))
+        if not keys:
+            raise SystemExit("No keys to compare on; pass --keys.")
+        report = check_parity(create_embedding_model(model_name, args.engine), create_embedding_model(model_name), keys)
+        print(json.dumps(report, indent=2))
+        if report["mean_cosine"] < args.min_cosine:
+            raise SystemExit(f"❌ Mean cosine {report['mean_cosine']:.4f} is below {args.min_cosine}")
@@ -0,0 +1,131 @@
+"""
+Exact-key index that sits in front of semantic search.
+
+chat() builds the same deterministic storage key ("wife passport number") for
+storing and for retrieving, so a retrieval for a key this process has seen is
+answered from a dict instead of an embedding plus a nearest-neighbour query.
+Each user's keys are indexed both as-is and in normalized form (stopwords and
+punctuation removed, as preprocess_query does). Only the most recently active
+`max_users` users are kept; with `max_users=0` the index is off.
+
+Entries are stamped with the user's response-cache generation (see
+response_cache.py), which every write on any worker bumps. A lookup made
+under a newer generation treats older entries as misses, so a value deleted
+or overwritten elsewhere is not served from this process's memory.
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+NLP_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../NLP_Query_Processing"))
+sys.path.append(NLP_PATH)
+
+from nlp_processing import preprocess_query
+
+
+class ExactKeyIndex:
+    """
+    Per-user map from storage key to the stored value and its vector id.
+    """
+
+    def __init__(self, max_users=10000):
+        self.max_users = max_users
+        self.hits = 0
+        self.misses = 0
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _user_entries(self, user, create=False):
+        entries = self._users.get(user)
+        if entries is None and create:
+            entries = {"exact": {}, "normalized": {}}
+            self._users[user] = entries
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        if entries is not None:
+            self._users.move_to_end(user)
+        return entries
+
+    def put(self, user, key, value, vector_id=None, generation=None):
+        """
+        Records (or overwrites) the value stored under `key` for `user`, as of
+        the user's response-cache `generation`.
+        """
+        if self.max_users <= 0:
+            return
+        key = key.strip().lower()
+        normalized = preprocess_query(key)
+        with self._lock:
+            entries = self._user_entries(user, create=True)
+            entries["exact"][key] = {"key": key, "value": value, "vector_id": vector_id, "generation": generation}
+            if normalized:
+                entries["normalized"][normalized] = key
+
+    def get(self, user, key, generation=None):
+        """
+        Returns {"key", "value", "vector_id", "generation"} for an exact or
+        normalized hit, else None. With `generation`, entries recorded under
+        another generation are misses.
+        """
+        key = key.strip().lower()
+        with self._lock:
+            entries = self._user_entries(user)
+            entry = None
+            if entries is not None:
+                entry = entries["exact"].get(key)
+                if entry is None:
+                    exact_key = entries["normalized"].get(preprocess_query(key))
+                    entry = entries["exact"].get(exact_key) if exact_key else None
+            if entry is not None and generation is not None and entry["generation"] != generation:
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(entry)
+
+    def advance(self, user, previous, generation):
+        """
+        Restamps `user`'s entries from `previous` to `generation`, for an
+        invalidation that this process knows changed nothing they hold.
+        """
+        with self._lock:
+            entries = self._users.get(user)
+            if entries is None:
+                return
+            for entry in entries["exact"].values():
+                if entry["generation"] == previous:
+                    entry["generation"] = generation
+
+    def remove(self, user, key):
+        """
+        Forgets `key` for `user` (both its exact and normalized forms).
+        """
+        key = key.strip().lower()
+        normalized = preprocess_query(key)
+        with self._lock:
+            entries = self._user_entries(user)
+            if entries is None:
+                return
+            entries["exact"].pop(key, None)
+            if entries["normalized"].get(normalized) == key:
+                del entries["normalized"][normalized]
+
+    def clear(self, user=None):
+        with self._lock:
+            if user is None:
+                self._users.clear()
+            else:
+                self._users.pop(user, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "users": len(self._users),
+                "keys": sum(len(entries["exact"]) for entries in self._users.values()),
+            }
@@ -0,0 +1,256 @@
+"""
+Process-wide registry for the embedding model, its cache and batcher, the
+exact-key index, the response cache, the vector store client, its write buffer
+and the thread pool that runs concurrent vector queries.
+
+Nothing is loaded at import time. The first caller pays the start-up cost and
+every later caller in the same process shares the instance. `warm_up()` lets
+the Flask app do that work before it starts serving requests.
+"""
+
+import atexit
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import EmbeddingCache
+from embedding_engines import create_embedding_model
+from key_index import ExactKeyIndex
+from response_cache import create_response_cache
+from vector_store import create_vector_store
+from write_buffer import WriteBuffer
+
+dotenv_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".env"))
+load_dotenv(dotenv_path)
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_ENGINE = os.getenv("EMBEDDING_ENGINE", "sentence-transformers").strip().lower()
+# Cached embeddings are only reused by the engine that computed them
+EMBEDDING_MODEL_ID = EMBEDDING_MODEL_NAME if EMBEDDING_ENGINE == "sentence-transformers" else f"{EMBEDDING_MODEL_NAME}#{EMBEDDING_ENGINE}"
+# ONNX Runtime sessions must not cross a fork; those engines load in each worker
+EMBEDDING_FORK_SAFE = EMBEDDING_ENGINE == "sentence-transformers"
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")  # e.g. /var/cache/llm/embeddings.sqlite
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+KEY_INDEX_MAX_USERS = int(os.getenv("KEY_INDEX_MAX_USERS", "10000"))
+WRITE_BUFFER_MAX_SIZE = int(os.getenv("WRITE_BUFFER_MAX_SIZE", "100"))
+WRITE_BUFFER_MAX_WAIT_MS = float(os.getenv("WRITE_BUFFER_MAX_WAIT_MS", "20"))  # 0 writes through
+WRITE_BUFFER_MAX_ATTEMPTS = int(os.getenv("WRITE_BUFFER_MAX_ATTEMPTS", "5"))  # failed flushes before a write is dropped
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", "8"))  # concurrent vector queries per process
+WARM_START_SNAPSHOT = os.getenv("WARM_START_SNAPSHOT")  # snapshot directory loaded by warm_up()
+
+_lock = threading.Lock()
+_embedding_model = None
+_engine_threads = None
+_embedding_cache = None
+_embedding_batcher = None
+_key_index = None
+_response_cache = None
+_vector_store = None
+_write_buffer = None
+_query_executor = None
+
+
+def get_embedding_model():
+    """
+    Returns the shared embedding engine (EMBEDDING_ENGINE), loading it on first use.
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        with _lock:
+            if _embedding_model is None:
+                _embedding_model = create_embedding_model(EMBEDDING_MODEL_NAME, EMBEDDING_ENGINE, _engine_threads)
+    return _embedding_model
+
+
+def get_embedding_cache():
+    """
+    Returns the shared embedding cache, opening the persistent tier on first use.
+    Vectors still queued for the disk tier are written at interpreter exit.
+    """
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_PATH)
+                atexit.register(_embedding_cache.flush)
+    return _embedding_cache
+
+
+def _encode_batch(texts):
+    return get_embedding_model().encode(texts, batch_size=len(texts)).tolist()
+
+
+def get_embedding_batcher():
+    """
+    Returns the shared micro-batching scheduler in front of the embedding model.
+    """
+    global _embedding_batcher
+    if _embedding_batcher is None:
+        with _lock:
+            if _embedding_batcher is None:
+                _embedding_batcher = EmbeddingBatcher(_encode_batch, EMBED_BATCH_MAX_SIZE, EMBED_BATCH_MAX_WAIT_MS)
+    return _embedding_batcher
+
+
+def get_key_index():
+    """
+    Returns the shared exact-key index consulted before semantic search.
+    """
+    global _key_index
+    if _key_index is None:
+        with _lock:
+            if _key_index is None:
+                _key_index = ExactKeyIndex(KEY_INDEX_MAX_USERS)
+    return _key_index
+
+
+def get_response_cache():
+    """
+    Returns the shared per-user cache of retrieval answers.
+    """
+    global _response_cache
+    if _response_cache is None:
+        with _lock:
+            if _response_cache is None:
+                _response_cache = create_response_cache()
+    return _response_cache
+
+
+def get_vector_store():
+    """
+    Returns the shared vector store client, connecting on first use.
+    """
+    global _vector_store
+    if _vector_store is None:
+        with _lock:
+            if _vector_store is None:
+                _vector_store = create_vector_store()
+    return _vector_store
+
+
+def namespace_user(namespace):
+    """
+    Returns the user a vector store namespace ("user_<id>") belongs to.
+    """
+    return namespace[len("user_"):] if namespace.startswith("user_") else namespace
+
+
+def _invalidate_flushed(namespaces):
+    # Answers cached while a write was still buffered may predate it. The
+    # key index already holds those writes, so its entries stay valid
+    cache = get_response_cache()
+    for namespace in namespaces:
+        user = namespace_user(namespace)
+        previous, generation = cache.invalidate(user)
+        get_key_index().advance(user, previous, generation)
+
+
+def _forget_dropped(namespace, vector_ids):
+    # The key index and cached answers may still serve the dropped writes
+    user = namespace_user(namespace)
+    get_key_index().clear(user)
+    get_response_cache().invalidate(user)
+
+
+def get_write_buffer():
+    """
+    Returns the shared write-coalescing buffer in front of the vector store.
+    Pending writes are flushed at interpreter exit.
+    """
+    global _write_buffer
+    if _write_buffer is None:
+        with _lock:
+            if _write_buffer is None:
+                _write_buffer = WriteBuffer(
+                    get_vector_store, WRITE_BUFFER_MAX_SIZE, WRITE_BUFFER_MAX_WAIT_MS, _invalidate_flushed,
+                    WRITE_BUFFER_MAX_ATTEMPTS, _forget_dropped,
+                )
+                atexit.register(_write_buffer.flush)
+    return _write_buffer
+
+
+def get_query_executor():
+    """
+    Returns the shared thread pool that runs the lookups of a multi-key question concurrently.
+    """
+    global _query_executor
+    if _query_executor is None:
+        with _lock:
+            if _query_executor is None:
+                _query_executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="vector-query")
+    return _query_executor
+
+
+def set_embedding_model(model):
+    """
+    Replaces the shared embedding model (e.g. with a stand-in for benchmarks).
+    Any object with a SentenceTransformer-style encode() works.
+    """
+    global _embedding_model
+    with _lock:
+        _embedding_model = model
+
+
+def set_vector_store(store):
+    """
+    Replaces the shared vector store (e.g. with an in-process fake index).
+    """
+    global _vector_store
+    with _lock:
+        _vector_store = store
+
+
+def set_engine_threads(threads):
+    """
+    Sets the intra-op thread count of ONNX engines loaded from now on (e.g. a
+    forked worker's share of the cores).
+    """
+    global _engine_threads
+    _engine_threads = threads
+
+
+def preload():
+    """
+    Loads only what forked workers can safely share: the embedding model, when
+    its engine survives a fork. Clients, threads, file handles and ONNX Runtime
+    sessions are left for each worker to open.
+    """
+    if EMBEDDING_FORK_SAFE:
+        get_embedding_model()
+
+
+def reset_after_fork():
+    """
+    Forgets the clients, threads and connections a forked worker inherited,
+    so it opens its own on first use. The model weights are kept (shared
+    copy-on-write with the parent) unless the engine is not fork-safe.
+    """
+    global _lock, _embedding_model, _embedding_cache, _embedding_batcher, _vector_store, _write_buffer, _query_executor
+    _lock = threading.Lock()
+    if not EMBEDDING_FORK_SAFE:
+        _embedding_model = None
+    _embedding_cache = None
+    _embedding_batcher = None
+    _vector_store = None
+    _write_buffer = None
+    _query_executor = None
+
+
+def warm_up():
+    """
+    Loads the embedding model and connects to the vector store up front so the
+    first request does not pay for it. With WARM_START_SNAPSHOT set, the
+    exact-key index and embedding cache are filled from that snapshot.
+    """
+    get_embedding_model()
+    get_embedding_cache()
+    get_vector_store()
+    if WARM_START_SNAPSHOT:
+        from snapshots import warm_start
+
+        warm_start(WARM_START_SNAPSHOT)
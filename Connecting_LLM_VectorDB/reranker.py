@@ -0,0 +1,104 @@
+"""
+Re-ranking of vector search candidates.
+
+The nearest neighbour by cosine similarity alone is not always the right key:
+"passport number" and "wife passport number" embed almost identically. search
+asks the vector store for the top RERANK_TOP_K candidates and re-scores them
+all at once with NumPy:
+
+    score = w_sim * cosine + w_key * key token overlap (Dice) + w_rel * relation match
+
+Candidates below the cosine threshold are dropped and the best combined score
+wins. Configure with:
+
+    RERANK_TOP_K                 candidates fetched per query (default 5)
+    SIMILARITY_THRESHOLD         minimum cosine similarity (default 0.5)
+    RERANK_SIMILARITY_WEIGHT     weight of the cosine similarity (default 1.0)
+    RERANK_KEY_WEIGHT            weight of the key token overlap (default 0.3)
+    RERANK_RELATION_WEIGHT       weight of the relation match (default 0.2)
+"""
+
+import os
+
+import numpy as np
+
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "5"))
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.5"))
+RERANK_SIMILARITY_WEIGHT = float(os.getenv("RERANK_SIMILARITY_WEIGHT", "1.0"))
+RERANK_KEY_WEIGHT = float(os.getenv("RERANK_KEY_WEIGHT", "0.3"))
+RERANK_RELATION_WEIGHT = float(os.getenv("RERANK_RELATION_WEIGHT", "0.2"))
+
+
+class Reranker:
+    """
+    Scores vector store matches against the query's key tokens and relation.
+
+    Args:
+        threshold (float): Minimum cosine similarity a candidate needs.
+        similarity_weight (float): Weight of the cosine similarity.
+        key_weight (float): Weight of the Dice overlap between key tokens.
+        relation_weight (float): Weight of an exact relation match.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, similarity_weight=RERANK_SIMILARITY_WEIGHT,
+                 key_weight=RERANK_KEY_WEIGHT, relation_weight=RERANK_RELATION_WEIGHT):
+        self.threshold = threshold
+        self.similarity_weight = similarity_weight
+        self.key_weight = key_weight
+        self.relation_weight = relation_weight
+
+    def scores(self, matches, query_tokens, relation=None):
+        """
+        Returns (combined scores, cosine similarities) as arrays, one entry per match.
+
+        Args:
+            matches (list): Vector store matches with "score" and "metadata".
+            query_tokens (list): Normalized tokens of the query key.
+            relation (str): Relation asked for, or None. When None, a candidate's
+                relation matches if it is empty or appears among the query tokens.
+        """
+        similarity = np.fromiter((match["score"] for match in matches), dtype=np.float64, count=len(matches))
+
+        query_set = set(query_tokens)
+        vocabulary = {token: column for column, token in enumerate(query_set)}
+        # Rows: candidates, columns: query tokens present in the candidate's key
+        present = np.zeros((len(matches), max(len(vocabulary), 1)), dtype=np.float64)
+        key_lengths = np.zeros(len(matches), dtype=np.float64)
+        candidate_relations = []
+        for row, match in enumerate(matches):
+            metadata = match.get("metadata") or {}
+            key_tokens = set(metadata.get("key", "").lower().split())
+            key_lengths[row] = len(key_tokens)
+            for token in key_tokens & query_set:
+                present[row, vocabulary[token]] = 1.0
+            candidate_relations.append((metadata.get("relation") or "").lower())
+
+        denominator = key_lengths + len(query_set)
+        overlap = np.divide(2 * present.sum(axis=1), denominator, out=np.zeros_like(denominator), where=denominator > 0)
+
+        candidate_relations = np.array(candidate_relations, dtype=object)
+        if relation:
+            relation_match = candidate_relations == relation.strip().lower()
+        else:
+            relation_match = np.fromiter(
+                (not candidate or candidate in query_set for candidate in candidate_relations),
+                dtype=bool, count=len(matches),
+            )
+
+        combined = (
+            self.similarity_weight * similarity
+            + self.key_weight * overlap
+            + self.relation_weight * relation_match
+        )
+        return combined, similarity
+
+    def best(self, matches, query_tokens, relation=None):
+        """
+        Returns the index of the best match above the threshold, or None.
+        """
+        if not matches:
+            return None
+        combined, similarity = self.scores(matches, query_tokens, relation)
+        combined = np.where(similarity >= self.threshold, combined, -np.inf)
+        index = int(np.argmax(combined))
+        return index if np.isfinite(combined[index]) else None
@@ -0,0 +1,226 @@
+"""
+Per-user cache of retrieval answers, in front of search_text.
+
+Clients poll the same questions, and an answer only changes when that user
+writes. Entries are keyed by (user, normalized retrieval key) and expire after
+`ttl` seconds. Every write for a user bumps the user's generation, which
+invalidates all of their entries at once. The generation is read together
+with the entry and handed back on put, so an answer computed while a write
+was in progress is never cached as current. The exact-key index
+(key_index.py) stamps its entries with the same generation.
+
+    LocalResponseCache   in-process, bounded by entry and user count (one worker)
+    RedisResponseCache   shared between workers, so a write on one worker
+                         invalidates the answers cached by all of them
+
+Configure with:
+
+    RESPONSE_CACHE_BACKEND       local (default), redis or off
+    RESPONSE_CACHE_SIZE          local entries kept (default 50000)
+    RESPONSE_CACHE_MAX_USERS     local users tracked (default 10000)
+    RESPONSE_CACHE_TTL_SECONDS   entry lifetime (default 300)
+    RESPONSE_CACHE_REDIS_URL     redis://host:6379/0 for the redis backend
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalResponseCache:
+    """
+    Thread-safe in-process response cache.
+
+    Once more than `max_entries` answers are cached, the least recently used
+    users' answers are dropped; their generations are kept, so the key index
+    entries stamped with them stay valid. Users themselves are evicted least
+    recently used first once more than `max_users` are tracked (lookups and
+    invalidations create a user's record even when nothing is cached). With
+    `max_entries=0` nothing is cached, but generations still advance.
+    """
+
+    def __init__(self, max_entries=50000, ttl=300, clock=time.time, max_users=10000):
+        self.max_entries = max_entries
+        self.max_users = max(1, max_users)
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._users = OrderedDict()  # user -> {"generation": int, "entries": {key: (value, expires_at)}}
+        self._size = 0
+        # Generations are unique across users, so an evicted user never reuses one
+        self._generations = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _user(self, user):
+        record = self._users.get(user)
+        if record is None:
+            record = {"generation": next(self._generations), "entries": {}}
+            self._users[user] = record
+            while len(self._users) > self.max_users:
+                _, evicted = self._users.popitem(last=False)
+                self._size -= len(evicted["entries"])
+        self._users.move_to_end(user)
+        return record
+
+    def get(self, user, key):
+        """
+        Returns (cached value or None, generation to pass to put).
+        """
+        with self._lock:
+            record = self._user(user)
+            entry = record["entries"].get(key)
+            if entry is not None and entry[1] <= self.clock():
+                del record["entries"][key]
+                self._size -= 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None, record["generation"]
+            self.hits += 1
+            return entry[0], record["generation"]
+
+    def put(self, user, key, value, generation):
+        """
+        Caches `value` unless the user has written since `generation` was read.
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            record = self._users.get(user)
+            if record is None or record["generation"] != generation:
+                return
+            if key not in record["entries"]:
+                self._size += 1
+            record["entries"][key] = (value, self.clock() + self.ttl)
+
+            # Drop answers, not users: the generations must outlive them
+            for evicted in self._users.values():
+                if self._size <= self.max_entries:
+                    break
+                self._size -= len(evicted["entries"])
+                evicted["entries"] = {}
+
+    def generation(self, user):
+        """
+        Returns the user's current generation.
+        """
+        with self._lock:
+            return self._user(user)["generation"]
+
+    def invalidate(self, user):
+        """
+        Drops every cached answer of `user`.
+
+        Returns:
+            tuple: (generation just before, new generation)
+        """
+        with self._lock:
+            record = self._user(user)
+            previous = record["generation"]
+            self._size -= len(record["entries"])
+            record["entries"] = {}
+            record["generation"] = next(self._generations)
+            return previous, record["generation"]
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "users": len(self._users), "entries": self._size}
+
+
+class RedisResponseCache:
+    """
+    Response cache shared through Redis.
+
+    Each user has a generation counter and a hash of entries. A lookup and an
+    invalidation are one round trip each. Memory is bounded by the TTL and the
+    server's maxmemory policy.
+    """
+
+    def __init__(self, client, prefix="responses:", ttl=300, clock=time.time):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _keys(self, user):
+        return f"{self.prefix}gen:{user}", f"{self.prefix}entries:{user}"
+
+    def get(self, user, key):
+        generation_key, entries_key = self._keys(user)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(generation_key)
+        pipe.hget(entries_key, key)
+        generation, raw = pipe.execute()
+        generation = int(generation or 0)
+
+        if raw is not None:
+            entry = json.loads(raw)
+            if entry["generation"] == generation and entry["expires_at"] > self.clock():
+                self.hits += 1
+                return entry["value"], generation
+        self.misses += 1
+        return None, generation
+
+    def put(self, user, key, value, generation):
+        # Entries carry the generation they were computed under; get() ignores
+        # any written after a later invalidation
+        _, entries_key = self._keys(user)
+        entry = json.dumps({"value": value, "generation": generation, "expires_at": self.clock() + self.ttl})
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(entries_key, key, entry)
+        pipe.expire(entries_key, int(self.ttl) + 1)
+        pipe.execute()
+
+    def generation(self, user):
+        generation_key, _ = self._keys(user)
+        return int(self.client.get(generation_key) or 0)
+
+    def invalidate(self, user):
+        generation_key, entries_key = self._keys(user)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.incr(generation_key)
+        pipe.delete(entries_key)
+        generation = int(pipe.execute()[0])
+        return generation - 1, generation
+
+    def clear(self):
+        for redis_key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(redis_key)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def create_response_cache():
+    """
+    Builds the response cache configured by the RESPONSE_CACHE_* environment variables.
+    """
+    backend_name = os.getenv("RESPONSE_CACHE_BACKEND", "local").strip().lower()
+    ttl = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+    max_users = int(os.getenv("RESPONSE_CACHE_MAX_USERS", "10000"))
+
+    if backend_name == "off":
+        return LocalResponseCache(max_entries=0, ttl=ttl, max_users=max_users)  # Tracks generations, caches nothing
+    if backend_name == "redis":
+        return RedisResponseCache.from_url(os.getenv("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0"), ttl=ttl)
+    if backend_name == "local":
+        return LocalResponseCache(int(os.getenv("RESPONSE_CACHE_SIZE", "50000")), ttl, max_users=max_users)
+    raise ValueError(f"Unknown response cache backend '{backend_name}'. Use 'local', 'redis' or 'off'.")
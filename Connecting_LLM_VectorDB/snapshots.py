@@ -0,0 +1,285 @@
+"""
+Streaming snapshots of the vector store: export, import and warm start.
+
+A snapshot is a directory that is written one page at a time, so memory use
+stays flat however many users are exported:
+
+    manifest.json     format, embedding model id, dimension, dtype and
+                      per-namespace counts (written last; a snapshot without
+                      one is incomplete)
+    records.jsonl     one {"namespace", "id", "metadata"} line per vector
+    embeddings.f32    the vectors as a raw row-major matrix, in the same
+                      order as records.jsonl (.f16 with --dtype float16)
+
+Importing upserts the stored vectors in batches, without re-embedding, so
+migrations and backfills do not re-encode every key. The embeddings only
+mean something to the model that computed them, so a snapshot from another
+EMBEDDING_MODEL_ID is refused unless forced.
+
+Warm start loads a snapshot into this process's exact-key index and
+embedding cache, so a restarted worker answers known keys without a vector
+query or an encode. The snapshot is trusted to be current (take it at
+shutdown or deploy). Set WARM_START_SNAPSHOT to do that in `warm_up()`; the
+`warm` command only outlives its own process through the persistent
+embedding cache (EMBEDDING_CACHE_PATH).
+
+    python Connecting_LLM_VectorDB/snapshots.py export /backups/2024-06-01
+    python Connecting_LLM_VectorDB/snapshots.py import /backups/2024-06-01 --batch-size 200
+    python Connecting_LLM_VectorDB/snapshots.py warm /backups/2024-06-01
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+SECURITY_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../LLM_Security"))
+sys.path.append(SECURITY_PATH)
+
+import model_registry
+from model_registry import EMBEDDING_MODEL_ID, namespace_user
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+RECORDS_FILE = "records.jsonl"
+EMBEDDING_FILES = {"float32": "embeddings.f32", "float16": "embeddings.f16"}
+DEFAULT_PAGE_SIZE = 500
+
+
+def export_snapshot(path, store=None, namespaces=None, page_size=DEFAULT_PAGE_SIZE, dtype="float32"):
+    """
+    Streams every vector of `namespaces` (default: all) into a snapshot at `path`.
+
+    Returns:
+        dict: The manifest that was written.
+    """
+    if dtype not in EMBEDDING_FILES:
+        raise ValueError(f"Unsupported snapshot dtype '{dtype}'. Use one of: {', '.join(EMBEDDING_FILES)}.")
+    store = store or model_registry.get_vector_store()
+    model_registry.get_write_buffer().flush()  # Include writes that are still buffered
+
+    os.makedirs(path, exist_ok=True)
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)  # Marks the snapshot incomplete until the export finishes
+
+    counts = {}
+    dimension = None
+    with open(os.path.join(path, RECORDS_FILE), "w", encoding="utf-8") as records_file, \
+            open(os.path.join(path, EMBEDDING_FILES[dtype]), "wb") as embeddings_file:
+        for namespace in namespaces if namespaces is not None else store.list_namespaces():
+            for page in store.iter_vectors(namespace, page_size):
+                if not page:
+                    continue
+                matrix = np.asarray([values for _, values, _ in page], dtype=dtype)
+                if dimension is None:
+                    dimension = matrix.shape[1]
+                elif matrix.shape[1] != dimension:
+                    raise ValueError(f"Namespace '{namespace}' has {matrix.shape[1]}-d vectors, expected {dimension}.")
+
+                for vector_id, _, metadata in page:
+                    records_file.write(json.dumps({"namespace": namespace, "id": vector_id, "metadata": metadata}) + "\n")
+                matrix.tofile(embeddings_file)
+                counts[namespace] = counts.get(namespace, 0) + len(page)
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "model_id": EMBEDDING_MODEL_ID,
+        "dimension": dimension or 0,
+        "dtype": dtype,
+        "created_at": time.time(),
+        "vectors": sum(counts.values()),
+        "namespaces": counts,
+    }
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    logger.info("Exported %d vectors from %d namespaces to %s", manifest["vectors"], len(counts), path)
+    return manifest
+
+
+def read_manifest(path):
+    """
+    Returns the manifest of a complete snapshot; raises ValueError otherwise.
+    """
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise ValueError(f"{path} has no {MANIFEST_FILE}; the snapshot is missing or incomplete.")
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format')} in {path}.")
+    return manifest
+
+
+def _embeddings(path, manifest):
+    # The snapshot's embedding matrix, through a read-only memory map
+    return np.memmap(os.path.join(path, EMBEDDING_FILES[manifest["dtype"]]), dtype=manifest["dtype"],
+                     mode="r", shape=(manifest["vectors"], manifest["dimension"]))
+
+
+def _iter_records(path):
+    with open(os.path.join(path, RECORDS_FILE), "r", encoding="utf-8") as f:
+        for row, line in enumerate(f):
+            yield row, json.loads(line)
+
+
+def iter_snapshot(path, page_size=DEFAULT_PAGE_SIZE, namespaces=None):
+    """
+    Yields (namespace, [(id, values, metadata), ...]) pages from a snapshot.
+    Pages never span namespaces. The embeddings are read through a memory map.
+    """
+    manifest = read_manifest(path)
+    if not manifest["vectors"]:
+        return
+    matrix = _embeddings(path, manifest)
+    wanted = set(namespaces) if namespaces is not None else None
+
+    def page_of(batch, start):
+        vectors = np.asarray(matrix[start:start + len(batch)], dtype=np.float32)
+        return [(record["id"], values.tolist(), record["metadata"]) for record, values in zip(batch, vectors)]
+
+    batch, batch_namespace, batch_start = [], None, 0
+    for row, record in _iter_records(path):
+        if batch and (record["namespace"] != batch_namespace or len(batch) >= page_size):
+            if wanted is None or batch_namespace in wanted:
+                yield batch_namespace, page_of(batch, batch_start)
+            batch = []
+        if not batch:
+            batch_namespace, batch_start = record["namespace"], row
+        batch.append(record)
+    if batch and (wanted is None or batch_namespace in wanted):
+        yield batch_namespace, page_of(batch, batch_start)
+
+
+def _check_model(manifest, force):
+    if manifest["model_id"] != EMBEDDING_MODEL_ID and not force:
+        raise ValueError(
+            f"Snapshot embeddings are from '{manifest['model_id']}' but this process uses "
+            f"'{EMBEDDING_MODEL_ID}'; re-embed instead, or force the import."
+        )
+
+
+def import_snapshot(path, store=None, namespaces=None, batch_size=100, force=False):
+    """
+    Upserts a snapshot's vectors in batches of `batch_size`, without re-embedding.
+    Vector ids are kept, so importing twice overwrites rather than duplicates.
+
+    Returns:
+        int: Number of vectors imported.
+    """
+    manifest = read_manifest(path)
+    _check_model(manifest, force)
+    store = store or model_registry.get_vector_store()
+    model_registry.get_write_buffer().flush()  # Buffered writes must not land on top of the import
+
+    imported, users = 0, set()
+    for namespace, page in iter_snapshot(path, batch_size, namespaces):
+        store.upsert(vectors=page, namespace=namespace)
+        imported += len(page)
+        users.add(namespace_user(namespace))
+
+    # This process's view of the imported users is out of date
+    for user in users:
+        model_registry.get_key_index().clear(user)
+        model_registry.get_response_cache().invalidate(user)
+    logger.info("Imported %d vectors into %d namespaces from %s", imported, len(users), path)
+    return imported
+
+
+def _plaintext(user, metadata):
+    if not metadata.get("encrypted"):
+        return metadata.get("value")
+    if not os.getenv("ENCRYPTION_SECRET"):
+        return None  # Cannot decrypt here; the first retrieval of the key will index it
+    from encrypt_user_data import decrypt_user_data
+
+    return decrypt_user_data(user, metadata["value"])
+
+
+def warm_start(path, namespaces=None, force=False):
+    """
+    Loads a snapshot's keys into the exact-key index and its key embeddings
+    into the embedding cache.
+
+    Two passes over records.jsonl: the first only picks the row of each key's
+    newest vector, the second loads those rows through the memory map. Only
+    the newest `max_entries` embeddings go to the cache, in one batch.
+
+    Returns:
+        dict: How many keys and embeddings were loaded.
+    """
+    manifest = read_manifest(path)
+    _check_model(manifest, force)
+    if not manifest["vectors"]:
+        return {"keys": 0, "embeddings": 0}
+    key_index = model_registry.get_key_index()
+    embedding_cache = model_registry.get_embedding_cache()
+    response_cache = model_registry.get_response_cache()
+    wanted = set(namespaces) if namespaces is not None else None
+
+    # The newest vector of each key wins, as in search_text
+    latest = {}  # (namespace, key) -> (updated_at, row)
+    for row, record in _iter_records(path):
+        key = record["metadata"].get("key")
+        if not key or (wanted is not None and record["namespace"] not in wanted):
+            continue
+        slot = (record["namespace"], key)
+        updated_at = record["metadata"].get("updated_at", 0)
+        if slot not in latest or updated_at >= latest[slot][0]:
+            latest[slot] = (updated_at, row)
+
+    rows = {row for _, row in latest.values()}
+    cached_rows = {row for _, row in heapq.nlargest(embedding_cache.max_entries, latest.values())}
+    del latest
+
+    matrix = _embeddings(path, manifest)
+    keys, embeddings, generations = 0, [], {}
+    for row, record in _iter_records(path):
+        if row not in rows:
+            continue
+        metadata = record["metadata"]
+        if row in cached_rows:
+            # Stored vectors are embeddings of the storage key itself
+            embeddings.append((metadata["key"], np.asarray(matrix[row], dtype=np.float32)))
+        user = namespace_user(record["namespace"])
+        value = _plaintext(user, metadata)
+        if value is not None:
+            if user not in generations:
+                generations[user] = response_cache.generation(user)
+            key_index.put(user, metadata["key"], value, record["id"], generations[user])
+            keys += 1
+
+    embedding_cache.put_many(EMBEDDING_MODEL_ID, embeddings)
+    embedding_cache.flush()
+
+    logger.info("Warm start from %s: %d keys indexed, %d embeddings cached", path, keys, len(embeddings))
+    return {"keys": keys, "embeddings": len(embeddings)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export, import or warm-start from vector store snapshots.")
+    parser.add_argument("command", choices=("export", "import", "warm"))
+    parser.add_argument("path", help="snapshot directory")
+    parser.add_argument("--namespace", action="append", dest="namespaces", help="limit to a namespace (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=100, help="vectors per upsert on import")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="vectors read per page on export")
+    parser.add_argument("--dtype", default="float32", choices=sorted(EMBEDDING_FILES), help="embedding format on export")
+    parser.add_argument("--force", action="store_true", help="import embeddings from a different model")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "export":
+        print(json.dumps(export_snapshot(args.path, namespaces=args.namespaces, page_size=args.page_size, dtype=args.dtype), indent=2))
+    elif args.command == "import":
+        import_snapshot(args.path, namespaces=args.namespaces, batch_size=args.batch_size, force=args.force)
+    else:
+        print(json.dumps(warm_start(args.path, namespaces=args.namespaces, force=args.force), indent=2))
@@ -0,0 +1,513 @@
+"""
+Vector store backends used by vectordb.py.
+
+Every backend exposes the small part of the Pinecone index API that the
+storage layer relies on, so Pinecone is just one implementation:
+
+    upsert(vectors=[(id, values, metadata), ...], namespace="user_alice")
+    query(vector=[...], top_k=1, include_metadata=True, namespace="user_alice",
+          filter={"relation": {"$eq": "wife"}})
+    delete(ids=[...], namespace="user_alice")
+
+plus awaitable `aupsert`/`aquery`/`adelete` twins for the ASGI app, and
+`list_namespaces()` / `iter_vectors(namespace)` for exports.
+
+The backend is picked with the VECTOR_STORE_BACKEND environment variable
+("pinecone" by default, or "local"). LOCAL_VECTOR_DTYPE picks the local
+backend's storage format ("float32" by default, "float16" or "int8").
+"""
+
+import asyncio
+import functools
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+DEFAULT_INDEX_NAME = "text-search"
+DEFAULT_LOCAL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".vector_store"))
+
+# Storage formats for the local backend: (numpy dtype, matrix file extension)
+LOCAL_DTYPES = {
+    "float32": (np.float32, ".f32"),
+    "float16": (np.float16, ".f16"),
+    "int8": (np.int8, ".i8"),
+}
+# Rows converted to float32 at a time when scoring a float16/int8 matrix
+QUERY_BLOCK_ROWS = 16384
+# Metadata field the local backend keeps row partitions for, so filtering on
+# it narrows the rows scored instead of discarding scored ones
+PARTITION_FIELD = "relation"
+
+
+def _filter_value(condition):
+    # Supports the {"field": value} and {"field": {"$eq": value}} forms
+    return condition.get("$eq") if isinstance(condition, dict) else condition
+
+
+def _matches_filter(metadata, filter):
+    return all(metadata.get(field) == _filter_value(condition) for field, condition in filter.items())
+
+
+class _ExecutorAsyncMixin:
+    """
+    Async methods for backends without a native async client: the blocking
+    call runs in the event loop's default executor.
+    """
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    async def aupsert(self, vectors, namespace=""):
+        return await self._run_blocking(self.upsert, vectors=vectors, namespace=namespace)
+
+    async def aquery(self, vector, top_k=1, include_metadata=True, namespace="", filter=None):
+        return await self._run_blocking(self.query, vector=vector, top_k=top_k, include_metadata=include_metadata, namespace=namespace, filter=filter)
+
+    async def adelete(self, ids, namespace=""):
+        return await self._run_blocking(self.delete, ids=ids, namespace=namespace)
+
+    async def aclose(self):
+        return None
+
+
+class PineconeVectorStore:
+    """
+    Thin wrapper around a Pinecone index.
+
+    Sync calls go through the regular client. The async twins use
+    PineconeAsyncio, whose aiohttp session keeps a pool of open connections
+    to the index host for the lifetime of the event loop.
+    """
+
+    def __init__(self, api_key, index_name=DEFAULT_INDEX_NAME):
+        from pinecone import Pinecone
+
+        pc = Pinecone(api_key=api_key)
+
+        # Connect to existing Pinecone index
+        if index_name not in pc.list_indexes().names():
+            raise ValueError(f"Index '{index_name}' does not exist. Please create it in the Pinecone console.")
+
+        self.client = pc
+        self.api_key = api_key
+        self.index_name = index_name
+        self.index = pc.Index(index_name)
+        self._async_client = None
+        self._async_index = None
+        self._async_lock = None
+
+    def upsert(self, vectors, namespace=""):
+        return self.index.upsert(vectors=vectors, namespace=namespace)
+
+    def query(self, vector, top_k=1, include_metadata=True, namespace="", filter=None):
+        return self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata, namespace=namespace, filter=filter)
+
+    def delete(self, ids, namespace=""):
+        return self.index.delete(ids=ids, namespace=namespace)
+
+    def list_namespaces(self):
+        return sorted(self.index.describe_index_stats().get("namespaces", {}))
+
+    def iter_vectors(self, namespace="", page_size=100):
+        """
+        Yields pages of (id, values, metadata) with list() + fetch() (serverless indexes).
+        """
+        for ids in self.index.list(namespace=namespace, limit=page_size):
+            if not ids:
+                continue
+            fetched = self.index.fetch(ids=list(ids), namespace=namespace).vectors
+            yield [(vector_id, list(fetched[vector_id].values), dict(fetched[vector_id].metadata or {}))
+                   for vector_id in ids if vector_id in fetched]
+
+    async def _get_async_index(self):
+        if self._async_index is None:
+            if self._async_lock is None:
+                self._async_lock = asyncio.Lock()
+            async with self._async_lock:
+                if self._async_index is None:
+                    from pinecone import PineconeAsyncio
+
+                    loop = asyncio.get_running_loop()
+                    description = await loop.run_in_executor(None, self.client.describe_index, self.index_name)
+                    self._async_client = PineconeAsyncio(api_key=self.api_key)
+                    self._async_index = self._async_client.IndexAsyncio(host=description.host)
+        return self._async_index
+
+    async def aupsert(self, vectors, namespace=""):
+        index = await self._get_async_index()
+        return await index.upsert(vectors=vectors, namespace=namespace)
+
+    async def aquery(self, vector, top_k=1, include_metadata=True, namespace="", filter=None):
+        index = await self._get_async_index()
+        return await index.query(vector=vector, top_k=top_k, include_metadata=include_metadata, namespace=namespace, filter=filter)
+
+    async def adelete(self, ids, namespace=""):
+        index = await self._get_async_index()
+        return await index.delete(ids=ids, namespace=namespace)
+
+    async def aclose(self):
+        """
+        Closes the pooled async connections (call on application shutdown).
+        """
+        if self._async_index is not None:
+            await self._async_index.close()
+            await self._async_client.close()
+            self._async_index = None
+            self._async_client = None
+
+
+class _LocalNamespace:
+    """
+    One namespace of the local store: a contiguous matrix kept in a
+    memory-mapped file plus a JSON sidecar holding ids and metadata.
+
+    Vectors are L2-normalised on write so cosine similarity is a single
+    matrix-vector product at query time. The matrix is float32 by default;
+    float16 halves it and int8 (one float32 scale per row) quarters it, at a
+    small cost in score precision. float16 only saves memory: numpy converts
+    it back to float32 slowly, so int8 queries are faster than float16 ones.
+
+    Rows are also partitioned by their PARTITION_FIELD metadata value, so a
+    query filtered on it only scores that partition's rows.
+    """
+
+    def __init__(self, base_path, initial_capacity, dtype="float32", name=""):
+        self.name = name
+        self.base_path = base_path
+        self.sidecar_path = base_path + ".json"
+        self.initial_capacity = initial_capacity
+        self.dimension = None
+        self.capacity = 0
+        self.ids = []
+        self.metadata = []
+        self.rows = {}
+        self.partitions = {}  # PARTITION_FIELD value -> set of rows
+        self.matrix = None
+        self.scales = None
+
+        if os.path.exists(self.sidecar_path):
+            self._load()
+        else:
+            self._set_dtype(dtype)
+
+    def _set_dtype(self, dtype):
+        if dtype not in LOCAL_DTYPES:
+            raise ValueError(f"Unknown vector dtype '{dtype}'. Use one of: {', '.join(LOCAL_DTYPES)}.")
+        self.dtype = dtype
+        self.np_dtype, extension = LOCAL_DTYPES[dtype]
+        self.matrix_path = self.base_path + extension
+        self.scales_path = self.base_path + ".scale.f32"
+
+    @property
+    def count(self):
+        return len(self.ids)
+
+    def _load(self):
+        with open(self.sidecar_path, "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+
+        # Existing namespaces keep the format they were written in
+        self._set_dtype(sidecar.get("dtype", "float32"))
+        self.name = sidecar.get("namespace", self.name)
+        self.dimension = sidecar["dimension"]
+        self.capacity = sidecar["capacity"]
+        self.ids = sidecar["ids"]
+        self.metadata = sidecar["metadata"]
+        self.rows = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        for row, metadata in enumerate(self.metadata):
+            self._partition(metadata).add(row)
+        self.matrix = np.memmap(self.matrix_path, dtype=self.np_dtype, mode="r+", shape=(self.capacity, self.dimension))
+        if self.dtype == "int8":
+            self.scales = np.memmap(self.scales_path, dtype=np.float32, mode="r+", shape=(self.capacity,))
+
+    def _partition(self, metadata):
+        return self.partitions.setdefault(metadata.get(PARTITION_FIELD, ""), set())
+
+    def _move_partition(self, row, old_metadata, new_metadata):
+        if old_metadata is not None:
+            self._partition(old_metadata).discard(row)
+        if new_metadata is not None:
+            self._partition(new_metadata).add(row)
+
+    def _candidate_rows(self, filter):
+        """
+        Returns the sorted rows matching `filter`, or None for every row.
+        """
+        if not filter:
+            return None
+        rest = {field: condition for field, condition in filter.items() if field != PARTITION_FIELD}
+        if PARTITION_FIELD in filter:
+            rows = self.partitions.get(_filter_value(filter[PARTITION_FIELD]), ())
+        else:
+            rows = range(self.count)
+        if rest:
+            rows = [row for row in rows if _matches_filter(self.metadata[row], rest)]
+        return np.fromiter(sorted(rows), dtype=np.int64)
+
+    def _save_sidecar(self):
+        sidecar = {
+            "namespace": self.name,
+            "dimension": self.dimension,
+            "capacity": self.capacity,
+            "dtype": self.dtype,
+            "ids": self.ids,
+            "metadata": self.metadata,
+        }
+        tmp_path = self.sidecar_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(sidecar, f)
+        os.replace(tmp_path, self.sidecar_path)
+
+    def _ensure_capacity(self, needed):
+        if self.matrix is not None and needed <= self.capacity:
+            return
+
+        new_capacity = max(self.initial_capacity, self.capacity * 2, needed)
+        self._grow("matrix", self.matrix_path, self.np_dtype, (new_capacity, self.dimension))
+        if self.dtype == "int8":
+            self._grow("scales", self.scales_path, np.float32, (new_capacity,))
+        self.capacity = new_capacity
+
+    def _grow(self, attribute, path, dtype, shape):
+        tmp_path = path + ".tmp"
+        grown = np.memmap(tmp_path, dtype=dtype, mode="w+", shape=shape)
+        current = getattr(self, attribute)
+        if current is not None and self.count:
+            grown[:self.count] = current[:self.count]
+        grown.flush()
+        del grown, current
+
+        # Unmap the old file before replacing it
+        setattr(self, attribute, None)
+        os.replace(tmp_path, path)
+        setattr(self, attribute, np.memmap(path, dtype=dtype, mode="r+", shape=shape))
+
+    def _write_row(self, row, values):
+        if self.dtype == "int8":
+            # Symmetric per-row quantization: the largest component maps to ±127
+            scale = max(float(np.abs(values).max()), 1e-12) / 127.0
+            self.matrix[row] = np.round(values / scale).astype(np.int8)
+            self.scales[row] = scale
+        else:
+            self.matrix[row] = values
+
+    def _scores(self, query_vector, rows=None):
+        if rows is not None:
+            # Fancy indexing reads only the partition's rows from the memmap
+            scores = self.matrix[rows].astype(np.float32) @ query_vector
+            if self.dtype == "int8":
+                scores *= self.scales[rows]
+            return scores
+        if self.dtype == "float32":
+            return self.matrix[:self.count] @ query_vector
+
+        scores = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, QUERY_BLOCK_ROWS):
+            end = min(start + QUERY_BLOCK_ROWS, self.count)
+            scores[start:end] = self.matrix[start:end].astype(np.float32) @ query_vector
+        if self.dtype == "int8":
+            scores *= self.scales[:self.count]
+        return scores
+
+    def rows_as_float32(self, start, end):
+        """
+        Returns rows [start, end) decoded to float32 (normalised vectors).
+        """
+        rows = np.asarray(self.matrix[start:end], dtype=np.float32)
+        if self.dtype == "int8":
+            rows = rows * self.scales[start:end, None]
+        return rows
+
+    def _flush(self):
+        self.matrix.flush()
+        if self.scales is not None:
+            self.scales.flush()
+
+    def upsert(self, vectors):
+        if not vectors:
+            return 0
+
+        values = np.asarray([v[1] for v in vectors], dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = values.shape[1]
+        if values.shape[1] != self.dimension:
+            raise ValueError(f"Vector dimension {values.shape[1]} does not match namespace dimension {self.dimension}.")
+
+        norms = np.linalg.norm(values, axis=1, keepdims=True)
+        values = values / np.maximum(norms, 1e-12)
+
+        new_ids = [v[0] for v in vectors if v[0] not in self.rows]
+        self._ensure_capacity(self.count + len(new_ids))
+
+        for (vector_id, _, metadata), row_values in zip(vectors, values):
+            row = self.rows.get(vector_id)
+            if row is None:
+                row = self.count
+                self.rows[vector_id] = row
+                self.ids.append(vector_id)
+                self.metadata.append(metadata or {})
+                self._move_partition(row, None, self.metadata[row])
+            else:
+                self._move_partition(row, self.metadata[row], metadata or {})
+                self.metadata[row] = metadata or {}
+            self._write_row(row, row_values)
+
+        self._flush()
+        self._save_sidecar()
+        return len(vectors)
+
+    def query(self, vector, top_k, include_metadata, filter=None):
+        candidates = self._candidate_rows(filter)
+        total = self.count if candidates is None else len(candidates)
+        if not total:
+            return []
+
+        query_vector = np.asarray(vector, dtype=np.float32)
+        query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+
+        scores = self._scores(query_vector, candidates)
+        top_k = min(top_k, total)
+        if top_k < total:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(total)
+        best = best[np.argsort(-scores[best])]
+
+        matches = []
+        for position in best:
+            row = position if candidates is None else candidates[position]
+            match = {"id": self.ids[row], "score": float(scores[position])}
+            if include_metadata:
+                match["metadata"] = dict(self.metadata[row])
+            matches.append(match)
+        return matches
+
+    def delete(self, ids):
+        removed = 0
+        for vector_id in ids:
+            row = self.rows.pop(vector_id, None)
+            if row is None:
+                continue
+
+            # Move the last row into the hole so the matrix stays contiguous
+            last = self.count - 1
+            self._move_partition(row, self.metadata[row], None)
+            if row != last:
+                self._move_partition(last, self.metadata[last], None)
+                self._move_partition(row, None, self.metadata[last])
+                moved_id = self.ids[last]
+                self.matrix[row] = self.matrix[last]
+                if self.scales is not None:
+                    self.scales[row] = self.scales[last]
+                self.ids[row] = moved_id
+                self.metadata[row] = self.metadata[last]
+                self.rows[moved_id] = row
+            self.ids.pop()
+            self.metadata.pop()
+            removed += 1
+
+        if removed:
+            self._flush()
+            self._save_sidecar()
+        return removed
+
+
+class LocalVectorStore(_ExecutorAsyncMixin):
+    """
+    In-process vector store backed by memory-mapped float32 matrices.
+
+    Each namespace (e.g. "user_alice") lives in its own pair of files under
+    `directory`, so hot users' memories stay on local disk and in the page
+    cache instead of behind a network round trip. New namespaces are written
+    in `dtype` ("float32", "float16" or "int8").
+    """
+
+    def __init__(self, directory=DEFAULT_LOCAL_DIR, initial_capacity=1024, dtype="float32"):
+        if dtype not in LOCAL_DTYPES:
+            raise ValueError(f"Unknown vector dtype '{dtype}'. Use one of: {', '.join(LOCAL_DTYPES)}.")
+        self.directory = directory
+        self.initial_capacity = initial_capacity
+        self.dtype = dtype
+        self._namespaces = {}
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _namespace(self, namespace):
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            # Keep file names safe while avoiding collisions between similar namespaces
+            safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", namespace or "default")
+            digest = hashlib.sha1(namespace.encode()).hexdigest()[:8]
+            ns = _LocalNamespace(os.path.join(self.directory, f"{safe_name}-{digest}"), self.initial_capacity, self.dtype, namespace)
+            self._namespaces[namespace] = ns
+        return ns
+
+    def upsert(self, vectors, namespace=""):
+        with self._lock:
+            upserted = self._namespace(namespace).upsert(vectors)
+        return {"upserted_count": upserted}
+
+    def query(self, vector, top_k=1, include_metadata=True, namespace="", filter=None):
+        with self._lock:
+            matches = self._namespace(namespace).query(vector, top_k, include_metadata, filter)
+        return {"matches": matches, "namespace": namespace}
+
+    def delete(self, ids, namespace=""):
+        with self._lock:
+            self._namespace(namespace).delete(ids)
+        return {}
+
+    def list_namespaces(self):
+        names = set(self._namespaces)
+        for sidecar_path in glob.glob(os.path.join(self.directory, "*.json")):
+            with open(sidecar_path, "r", encoding="utf-8") as f:
+                name = json.load(f).get("namespace")
+            if name is not None:
+                names.add(name)
+        return sorted(names)
+
+    def iter_vectors(self, namespace="", page_size=100):
+        """
+        Yields pages of (id, values, metadata); each page is copied under the
+        lock, so writes can continue between pages.
+        """
+        start = 0
+        while True:
+            with self._lock:
+                ns = self._namespace(namespace)
+                end = min(start + page_size, ns.count)
+                if start >= end:
+                    return
+                rows = ns.rows_as_float32(start, end)
+                page = [(ns.ids[row], rows[row - start].tolist(), dict(ns.metadata[row])) for row in range(start, end)]
+            yield page
+            start = end
+
+
+def create_vector_store(backend=None):
+    """
+    Builds the vector store selected by VECTOR_STORE_BACKEND.
+
+    Args:
+        backend (str): Optional override ("pinecone" or "local").
+
+    Returns:
+        An object implementing upsert/query/delete.
+    """
+    backend = (backend or os.getenv("VECTOR_STORE_BACKEND", "pinecone")).strip().lower()
+
+    if backend == "pinecone":
+        return PineconeVectorStore(os.getenv("PINECONE_API_KEY"), os.getenv("PINECONE_INDEX_NAME", DEFAULT_INDEX_NAME))
+    if backend == "local":
+        return LocalVectorStore(
+            os.getenv("LOCAL_VECTOR_STORE_DIR", DEFAULT_LOCAL_DIR),
+            dtype=os.getenv("LOCAL_VECTOR_DTYPE", "float32").strip().lower(),
+        )
+
+    raise ValueError(f"Unknown vector store backend '{backend}'. Use 'pinecone' or 'local'.")
@@ -1,9 +1,10 @@
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone
+import asyncio
+import hashlib
+import logging
 import os
 import sys
+import time
 from dotenv import load_dotenv
-import uuid
 
 # Load environment variables
 PROJECT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../NLP_Query_Processing"))
@@ -13,61 +14,148 @@ sys.path.append(PROJECT_PATH)
 SECURITY_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../LLM_Security"))
 sys.path.append(SECURITY_PATH)
 
+MONITORING_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../Monitoring"))
+sys.path.append(MONITORING_PATH)
 
-from nlp_processing import extract_key_value
-from restrict_search import get_vector_search_results, verify_token
-# from encrypt_user_data import encrypt_user_data, decrypt_user_data
+from restrict_search import verify_token
+from encrypt_user_data import decrypt_user_data, encrypt_many
 from anomaly_detection import detect_anomaly
 from nlp_processing import build_storage_key
-from nlp_processing import preprocess_query 
+from nlp_processing import preprocess_query, preprocess_queries
+from model_registry import (
+    EMBEDDING_MODEL_ID, get_embedding_batcher, get_embedding_cache, get_key_index, get_query_executor,
+    get_response_cache, get_vector_store, get_write_buffer,
+)
+from reranker import RERANK_TOP_K, Reranker
+from tracing import metrics, trace, traced
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables (API keys)
 load_dotenv()
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+# Encrypt stored values with the user's key (requires ENCRYPTION_SECRET)
+ENCRYPT_VALUES = os.getenv("ENCRYPT_VALUES", "").lower() in ("1", "true", "yes")
+
+reranker = Reranker()
 
-# 1. Load a pretrained Sentence Transformer model
-model = SentenceTransformer("all-MiniLM-L6-v2")
 
-# The sentences to encode
-sentences = [
-    "The weather is lovely today.",
-    "It's so sunny outside!",
-    "He drove to the stadium.",
-]
+@traced("embedding")
+def embed_text(text):
+    """Generate embeddings, reusing the cached vector for text seen before."""
+    cache = get_embedding_cache()
+    embedding = cache.get(EMBEDDING_MODEL_ID, text)
+    if embedding is None:
+        embedding = get_embedding_batcher().embed(text)
+        cache.put(EMBEDDING_MODEL_ID, text, embedding)
+    return embedding
 
-# 2. Calculate embeddings by calling model.encode()
-embeddings = model.encode(sentences)
-print(embeddings.shape)
-# [3, 384]
 
-# 3. Calculate the embedding similarities
-similarities = model.similarity(embeddings, embeddings)
-print(similarities)
-# tensor([[1.0000, 0.6660, 0.1046],
-#         [0.6660, 1.0000, 0.1411],
-#         [0.1046, 0.1411, 1.0000]])
+@traced("embedding")
+def embed_texts(texts):
+    """Generate embeddings for several texts, encoding all cache misses in one batch."""
+    cache = get_embedding_cache()
+    embeddings = [cache.get(EMBEDDING_MODEL_ID, text) for text in texts]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
 
-# 4. Connect to Pinecone and store embeddings
-# Load Hugging Face embedding model
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+    if missing:
+        computed = get_embedding_batcher().embed_many([texts[i] for i in missing])
+        for i, embedding in zip(missing, computed):
+            cache.put(EMBEDDING_MODEL_ID, texts[i], embedding)
+            embeddings[i] = embedding
+    return embeddings
 
-# Initialize Pinecone
-pc = Pinecone(api_key=PINECONE_API_KEY) 
-index_name = "text-search"
 
-# Connect to existing Pinecone index
-if index_name not in pc.list_indexes().names():
-    raise ValueError(f"Index '{index_name}' does not exist. Please create it in the Pinecone console.")
+def embedding_cache_stats():
+    """Returns hit/miss counters for the embedding cache."""
+    return get_embedding_cache().stats()
 
-index = pc.Index(index_name)
 
-def embed_text(text):
-    """Generate embeddings."""
-    return model.encode(text).tolist()
+metrics.register_gauges("embedding_cache", embedding_cache_stats)
+metrics.register_gauges("exact_key_index", lambda: get_key_index().stats())
+metrics.register_gauges("response_cache", lambda: get_response_cache().stats())
+metrics.register_gauges("write_buffer", lambda: get_write_buffer().stats())
+
+
+def vector_id_for(storage_key):
+    """
+    Returns the deterministic vector id of a storage key within a user's namespace,
+    so storing a key again overwrites its vector instead of adding another.
+    """
+    return hashlib.sha1(storage_key.encode()).hexdigest()
+
+
+def _prepare_record(user, key, value, relation=None):
+    """
+    Builds the vector id, the text to embed and the metadata for one fact.
+    """
+    storage_key = build_storage_key(key, relation)
+    vector_id = vector_id_for(storage_key)
+    full_key = storage_key  # ✅ Store only the key for retrieval
+    metadata = {
+        "value": value,
+        "user": user,
+        "relation": relation or "",
+        "key": storage_key,
+        "updated_at": time.time()
+    }
+    return vector_id, full_key, metadata
+
+
+def _encrypt_values(user, records):
+    """
+    Returns the records with their metadata values encrypted when ENCRYPT_VALUES is on.
+    """
+    if not ENCRYPT_VALUES:
+        return records
+    encrypted = encrypt_many(user, [metadata["value"] for _, _, metadata in records])
+    return [
+        (vector_id, full_key, {**metadata, "value": value, "encrypted": True})
+        for (vector_id, full_key, metadata), value in zip(records, encrypted)
+    ]
+
+
+def _index_keys(user, records):
+    """
+    Records the new values in the exact-key index and returns the ids of older
+    vectors they replace (facts stored under random ids before ids were
+    deterministic).
+    """
+    # The key index lives in process memory, so it keeps the plaintext values
+    key_index = get_key_index()
+    superseded = []
+    for vector_id, _, metadata in records:
+        previous = key_index.get(user, metadata["key"])
+        # get() also matches normalized variants; only the same key is replaced
+        if previous is not None and previous["key"] == metadata["key"] and previous["vector_id"] not in (None, vector_id):
+            superseded.append(previous["vector_id"])
+    # Cached answers for this user may now be out of date. Index entries of
+    # other keys still hold; those of the written keys are replaced below
+    previous_generation, generation = get_response_cache().invalidate(user)
+    key_index.advance(user, previous_generation, generation)
+    for vector_id, _, metadata in records:
+        key_index.put(user, metadata["key"], metadata["value"], vector_id, generation)
+    return superseded
+
+
+def _current_generation(user, generation=None):
+    # Callers that already read the response cache pass its generation along
+    return get_response_cache().generation(user) if generation is None else generation
+
+
+def _queue_writes(user, records, vectors, batch_size):
+    superseded = _index_keys(user, records)
+    buffer = get_write_buffer()
+    # The store calls are timed when the buffer flushes (vector_upsert, vector_delete)
+    for start in range(0, len(vectors), batch_size):
+        buffer.upsert(vectors=vectors[start:start + batch_size], namespace=f"user_{user}")
+    if superseded:
+        buffer.delete(ids=superseded, namespace=f"user_{user}")
+
 
 def store_text(user, key, value, relation=None):
     """
-    Stores extracted key-value pairs in Pinecone securely.
+    Stores extracted key-value pairs in the vector store securely.
 
     Args:
         user (str): User identifier to store personalized data.
@@ -78,77 +166,405 @@ def store_text(user, key, value, relation=None):
         None
     """
     if not key or not value:
-        print("⚠️ Invalid key-value pair!")
+        logger.warning("⚠️ Invalid key-value pair!")
         return
-    
-    stored_value = value
+
+    vector_id, full_key, metadata = _prepare_record(user, key, value, relation)
+    embedding = embed_text(full_key)
+
+    [(_, _, stored_metadata)] = _encrypt_values(user, [(vector_id, full_key, metadata)])
+    vectors = [(vector_id, embedding, stored_metadata)]
+    logger.debug("Upserting into vector store with metadata: %s", stored_metadata)
+    _queue_writes(user, [(vector_id, full_key, metadata)], vectors, batch_size=1) # ✅ Namespaced per user
+
+    logger.info("Stored: '%s' (relation: %s) for user: %s", key, relation, user)
+
+
+def store_many(user, facts, batch_size=100):
+    """
+    Stores several key-value pairs with one batched embed and chunked upserts.
+
+    Args:
+        user (str): User identifier to store personalized data.
+        facts (iterable): (key, value, relation) triples; relation may be None.
+        batch_size (int): Maximum number of vectors per upsert request.
+
+    Returns:
+        int: Number of facts stored (invalid pairs are skipped).
+    """
+    records = []
+    for key, value, relation in facts:
+        if not key or not value:
+            logger.warning("⚠️ Skipping invalid key-value pair: %r → %r", key, value)
+            continue
+        records.append(_prepare_record(user, key, value, relation))
+
+    if not records:
+        return 0
+
+    embeddings = embed_texts([full_key for _, full_key, _ in records])
+    vectors = [
+        (vector_id, embedding, metadata)
+        for (vector_id, _, metadata), embedding in zip(_encrypt_values(user, records), embeddings)
+    ]
+    _queue_writes(user, records, vectors, batch_size)
+
+    logger.info("Stored %d facts for user: %s", len(vectors), user)
+    return len(vectors)
+
+
+def delete_text(user, key, relation=None):
+    """
+    Deletes the fact stored under a key (and any older duplicate this process knows of).
+
+    Args:
+        user (str): User identifier.
+        key (str): The key to delete (e.g. "passport number").
+        relation (str): Optional relation (e.g. "wife").
+
+    Returns:
+        str: The storage key that was deleted.
+    """
     storage_key = build_storage_key(key, relation)
-    vector_id = f"{user}_{key}"  # Create a unique ID per user
-    doc_id = f"{key}_{uuid.uuid4()}"  # Generate a unique ID for the document
-    vector_id = doc_id
-    full_key = f"{relation} {key}".strip() if relation else key
-    embedding = embed_text(full_key)  # ✅ Store only the key for retrieval
-
-    vectors = [(vector_id, embedding, {
-        "value": stored_value, 
-        "user": user,
-        "relation": relation or "",
-        "key": storage_key
-        })]
-    print("DEBUG: Upserting into Pinecone with metadata:", vectors)
-    index.upsert(vectors=vectors, namespace=f"user_{user}") # ✅ Add namespace
+    ids = {vector_id_for(storage_key)}
+
+    key_index = get_key_index()
+    previous = key_index.get(user, storage_key)
+    if previous is not None and previous["key"] == storage_key and previous["vector_id"]:
+        ids.add(previous["vector_id"])
+    key_index.remove(user, storage_key)
+
+    get_write_buffer().delete(ids=sorted(ids), namespace=f"user_{user}")
+    key_index.advance(user, *get_response_cache().invalidate(user))
 
-    print(f"Stored: '{key}' for user: {user}")
-    print(f"relation: {relation} for user: {user}")
+    logger.info("Deleted: '%s' for user: %s", storage_key, user)
+    return storage_key
 
 
-def search_text(user, query, top_k=1):
+def flush_writes():
+    """
+    Sends buffered vector store writes now (e.g. before reporting an import as done).
+    """
+    return get_write_buffer().flush()
+
+
+def search_text(user, query, top_k=None, relation=None, generation=None):
     """
     Searches for a stored key and returns only the decrypted value.
 
     - Ensures the request is authenticated.
-    - Limits search to the correct user's namespace.
+    - Limits search to the correct user's namespace, and to the facts about
+      `relation` when one is given.
     - Detects suspicious activity before retrieving data.
+    - Re-ranks the top candidates by similarity, key overlap and relation.
 
     Args:
         user (str): The user making the request.
         query (str): The user's search query.
-        top_k (int): Number of top results to return.
+        top_k (int): Number of candidates to re-rank (default: RERANK_TOP_K).
+        relation (str): Relation the question is about (e.g. "wife"), if known.
+        generation (int): The user's response-cache generation, if already read.
 
     Returns:
         str: The stored value if found, otherwise None.
     """
-    print(f"[DEBUG] Searching for query: '{query}' by user: '{user}'")
+    logger.debug("Searching for query: '%s' by user: '%s'", query, user)
 
     # Detect anomalies (e.g., excessive queries)
-    anomaly_alert = detect_anomaly(user)
+    with trace("anomaly_detection"):
+        anomaly_alert = detect_anomaly(user)
     if anomaly_alert != "Normal activity.":
         return {"error": anomaly_alert}, 429
 
-    # Securely query Pinecone
-    cleaned_query = preprocess_query(query)
-    print(f"[DEBUG] Cleaned query: '{cleaned_query}'")
+    # Exact or normalized key stored earlier (and not written since, on any
+    # worker): no embedding or vector query needed
+    with trace("key_index_lookup"):
+        generation = _current_generation(user, generation)
+        exact = get_key_index().get(user, query, generation)
+    if exact is not None:
+        logger.debug("Exact key hit: '%s'", exact["key"])
+        return exact["value"], 1.0
+
+    # Securely query the vector store
+    with trace("preprocessing"):
+        cleaned_query = preprocess_query(query)
+    logger.debug("Cleaned query: '%s'", cleaned_query)
     query_embedding = embed_text(cleaned_query)
-    print(f"[DEBUG] Generated embedding for query.")
-
-    results = index.query(vector=query_embedding, top_k=top_k, include_metadata=True, namespace=f"user_{user}")
-    print(f"[DEBUG] Raw Pinecone matches: {results.get('matches', [])}")
-
-    SIMILARITY_THRESHOLD = 0.5
-
-    if results and results["matches"]:
-        for match in results["matches"]:
-            print(f"[DEBUG] Match metadata: {match['metadata']}")
-
-            if match["score"] >= SIMILARITY_THRESHOLD and match["metadata"].get("user") == user: # ✅ Ensure result belongs to correct user
-                # encrypted_value = match["metadata"].get("value")  
-                # decrypted_value = decrypt_user_data(user, encrypted_value)  # 🔐 Decrypt before returning
-                stored_value = match["metadata"].get("value")
-                print(f"[DEBUG] Decrypted value: {stored_value}")
-                return stored_value, match["score"]
-            
-    print("[DEBUG] No matches found or user mismatch.")
-    return None, None
+
+    with trace("vector_query"):
+        results = _query_namespace(user, query_embedding, top_k, relation)
+    answer = _select_match(user, results, cleaned_query, relation, generation)
+    if _needs_unfiltered(relation, answer):
+        with trace("vector_query"):
+            results = _query_namespace(user, query_embedding, top_k)
+        answer = _select_match(user, results, cleaned_query, relation, generation)
+    return answer
+
+
+def _relation_filter(relation):
+    return {"relation": {"$eq": relation}} if relation else None
+
+
+def _query_namespace(user, embedding, top_k=None, relation=None):
+    """
+    Queries the user's namespace, pre-filtered to `relation`'s vectors when given.
+    """
+    return get_vector_store().query(
+        vector=embedding, top_k=top_k or RERANK_TOP_K, include_metadata=True, namespace=f"user_{user}",
+        filter=_relation_filter(relation),
+    )
+
+
+async def _aquery_namespace(user, embedding, top_k=None, relation=None):
+    """
+    Async version of _query_namespace.
+    """
+    return await get_vector_store().aquery(
+        vector=embedding, top_k=top_k or RERANK_TOP_K, include_metadata=True, namespace=f"user_{user}",
+        filter=_relation_filter(relation),
+    )
+
+
+def _needs_unfiltered(relation, answer):
+    # Facts imported as {"key": "wife ssn"} carry the relation in the key only,
+    # so a relation filter that finds nothing good enough is retried without it
+    return bool(relation) and answer[0] is None
+
+
+def search_many(user, queries, top_k=None, generation=None):
+    """
+    Answers several keys of one question: exact-key hits first, then one
+    batched embed for the rest and their vector queries run concurrently.
+    The whole question counts as one request against the rate limit.
+
+    Args:
+        user (str): The user making the request.
+        queries (list): (query, relation) pairs; relation may be None.
+        top_k (int): Number of candidates to re-rank per query.
+        generation (int): The user's response-cache generation, if already read.
+
+    Returns:
+        list: (value, similarity) per query, in order, or ({"error": ...}, 429) if rate limited.
+    """
+    with trace("anomaly_detection"):
+        anomaly_alert = detect_anomaly(user)
+    if anomaly_alert != "Normal activity.":
+        return {"error": anomaly_alert}, 429
+
+    generation = _current_generation(user, generation)
+    answers, pending = _exact_answers(user, queries, generation)
+    if not pending:
+        return answers
+
+    with trace("preprocessing"):
+        cleaned_queries = preprocess_queries([queries[i][0] for i in pending])
+    query_embeddings = embed_texts(cleaned_queries)
+
+    def lookup(embedding, relation):
+        return _query_namespace(user, embedding, top_k, relation)
+
+    with trace("vector_query"):
+        results = list(get_query_executor().map(lookup, query_embeddings, [queries[i][1] for i in pending]))
+    for i, cleaned_query, result in zip(pending, cleaned_queries, results):
+        answers[i] = _select_match(user, result, cleaned_query, queries[i][1], generation)
+
+    retry = [j for j, i in enumerate(pending) if _needs_unfiltered(queries[i][1], answers[i])]
+    if retry:
+        with trace("vector_query"):
+            results = list(get_query_executor().map(lookup, [query_embeddings[j] for j in retry], [None] * len(retry)))
+        for j, result in zip(retry, results):
+            i = pending[j]
+            answers[i] = _select_match(user, result, cleaned_queries[j], queries[i][1], generation)
+    return answers
+
+
+def _exact_answers(user, queries, generation):
+    """
+    Answers what the exact-key index can. Returns (answers with None gaps, indexes of the gaps).
+    """
+    key_index = get_key_index()
+    answers, pending = [], []
+    with trace("key_index_lookup"):
+        for i, (query, _) in enumerate(queries):
+            exact = key_index.get(user, query, generation)
+            answers.append((exact["value"], 1.0) if exact is not None else None)
+            if exact is None:
+                pending.append(i)
+    return answers, pending
+
+
+@traced("threshold_filter")
+def _select_match(user, results, cleaned_query, relation=None, generation=None):
+    """
+    Re-ranks the user's matches and returns (value, similarity) of the best one
+    above the similarity threshold.
+
+    The answer is remembered in the exact-key index under `generation`, read
+    before the vector query, so a write on any worker since then makes it a miss.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        # Only summarise matches; dumping whole responses is expensive under load
+        logger.debug("Vector store matches: %s", [(m.get("id"), m["score"]) for m in results.get("matches", [])])
+
+    # Matches come from the user's own namespace; skip deletes not flushed yet
+    buffer = get_write_buffer()
+    namespace = f"user_{user}"
+    newest = {}
+    for match in (results or {}).get("matches", []):
+        metadata = match["metadata"]
+        if buffer.pending_delete(namespace, match.get("id")):
+            continue
+        # Only the latest write of a key counts (older stores used random ids)
+        key = metadata.get("key") or match.get("id")
+        if key not in newest or metadata.get("updated_at", 0) > newest[key]["metadata"].get("updated_at", 0):
+            newest[key] = match
+    matches = list(newest.values())
+    best = reranker.best(matches, cleaned_query.split(), relation)
+    if best is None:
+        logger.debug("No match above the similarity threshold.")
+        return None, None
+
+    match = matches[best]
+    stored_value = match["metadata"].get("value")
+    if match["metadata"].get("encrypted"):
+        stored_value = decrypt_user_data(user, stored_value)  # 🔐 Decrypt before returning
+    if match["metadata"].get("key") and generation is not None and not buffer.pending(namespace, match.get("id")):
+        # Remember keys stored by earlier processes so their repeats become exact hits
+        get_key_index().put(user, match["metadata"]["key"], stored_value, match.get("id"), generation)
+    return stored_value, match["score"]
+
+
+# Async counterparts used by the ASGI app. CPU-bound steps run in the event
+# loop's default executor (bounded by the app) and embedding requests wait on
+# the micro-batcher's futures instead of blocking a thread.
+
+@traced("embedding")
+async def embed_texts_async(texts):
+    """Async version of embed_texts."""
+    cache = get_embedding_cache()
+    embeddings = [cache.get(EMBEDDING_MODEL_ID, text) for text in texts]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+    if missing:
+        batcher = get_embedding_batcher()
+        futures = [asyncio.wrap_future(batcher.submit(texts[i])) for i in missing]
+        for i, embedding in zip(missing, await asyncio.gather(*futures)):
+            cache.put(EMBEDDING_MODEL_ID, texts[i], embedding)
+            embeddings[i] = embedding
+    return embeddings
+
+
+async def embed_text_async(text):
+    """Async version of embed_text."""
+    return (await embed_texts_async([text]))[0]
+
+
+async def store_many_async(user, facts, batch_size=100):
+    """
+    Async version of store_many.
+    """
+    records = []
+    for key, value, relation in facts:
+        if not key or not value:
+            logger.warning("⚠️ Skipping invalid key-value pair: %r → %r", key, value)
+            continue
+        records.append(_prepare_record(user, key, value, relation))
+
+    if not records:
+        return 0
+
+    embeddings = await embed_texts_async([full_key for _, full_key, _ in records])
+    vectors = [
+        (vector_id, embedding, metadata)
+        for (vector_id, _, metadata), embedding in zip(_encrypt_values(user, records), embeddings)
+    ]
+    # Queueing is cheap, but with WRITE_BUFFER_MAX_WAIT_MS=0 it is the blocking upsert itself
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, _queue_writes, user, records, vectors, batch_size)
+
+    logger.info("Stored %d facts for user: %s", len(vectors), user)
+    return len(vectors)
+
+
+async def delete_text_async(user, key, relation=None):
+    """
+    Async version of delete_text.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, delete_text, user, key, relation)
+
+
+async def search_text_async(user, query, top_k=None, relation=None, generation=None):
+    """
+    Async version of search_text.
+    """
+    logger.debug("Searching for query: '%s' by user: '%s'", query, user)
+
+    # With RATE_LIMIT_BACKEND=redis this is a network round trip
+    loop = asyncio.get_running_loop()
+    with trace("anomaly_detection"):
+        anomaly_alert = await loop.run_in_executor(None, detect_anomaly, user)
+    if anomaly_alert != "Normal activity.":
+        return {"error": anomaly_alert}, 429
+
+    with trace("key_index_lookup"):
+        if generation is None:
+            generation = await loop.run_in_executor(None, _current_generation, user)
+        exact = get_key_index().get(user, query, generation)
+    if exact is not None:
+        return exact["value"], 1.0
+
+    with trace("preprocessing"):
+        cleaned_query = await loop.run_in_executor(None, preprocess_query, query)
+    query_embedding = await embed_text_async(cleaned_query)
+
+    with trace("vector_query"):
+        results = await _aquery_namespace(user, query_embedding, top_k, relation)
+    answer = _select_match(user, results, cleaned_query, relation, generation)
+    if _needs_unfiltered(relation, answer):
+        with trace("vector_query"):
+            results = await _aquery_namespace(user, query_embedding, top_k)
+        answer = _select_match(user, results, cleaned_query, relation, generation)
+    return answer
+
+
+async def search_many_async(user, queries, top_k=None, generation=None):
+    """
+    Async version of search_many: the vector queries are gathered on the event loop.
+    """
+    # With RATE_LIMIT_BACKEND=redis this is a network round trip
+    loop = asyncio.get_running_loop()
+    with trace("anomaly_detection"):
+        anomaly_alert = await loop.run_in_executor(None, detect_anomaly, user)
+    if anomaly_alert != "Normal activity.":
+        return {"error": anomaly_alert}, 429
+
+    if generation is None:
+        generation = await loop.run_in_executor(None, _current_generation, user)
+    answers, pending = _exact_answers(user, queries, generation)
+    if not pending:
+        return answers
+
+    with trace("preprocessing"):
+        cleaned_queries = await loop.run_in_executor(None, preprocess_queries, [queries[i][0] for i in pending])
+    query_embeddings = await embed_texts_async(cleaned_queries)
+
+    with trace("vector_query"):
+        results = await asyncio.gather(*(
+            _aquery_namespace(user, embedding, top_k, queries[i][1])
+            for i, embedding in zip(pending, query_embeddings)
+        ))
+    for i, cleaned_query, result in zip(pending, cleaned_queries, results):
+        answers[i] = _select_match(user, result, cleaned_query, queries[i][1], generation)
+
+    retry = [j for j, i in enumerate(pending) if _needs_unfiltered(queries[i][1], answers[i])]
+    if retry:
+        with trace("vector_query"):
+            results = await asyncio.gather(*(_aquery_namespace(user, query_embeddings[j], top_k) for j in retry))
+        for j, result in zip(retry, results):
+            i = pending[j]
+            answers[i] = _select_match(user, result, cleaned_queries[j], queries[i][1], generation)
+    return answers
 
 if __name__ == "__main__":
     # Store sample texts (only needed once)
@@ -0,0 +1,244 @@
+"""
+Write-coalescing buffer in front of the vector store.
+
+Vector ids are deterministic per (user, storage key), so rapid repeated
+writes to one key (a client re-sending "@update my wife's SSN ...") are writes
+to one id. Upserts and deletes are held for up to `max_wait_ms`. A later
+write to the same id replaces an earlier pending one, and a single worker
+thread then sends what is left as one batched upsert and one delete per
+namespace.
+
+Until a batch is flushed, the vector store can still return a pending delete.
+Readers should drop those ids (see `pending_delete`). Pending upserts are
+already visible through the exact-key index, which is updated before the
+write is queued.
+
+Each batch is sent on its own, so a failing namespace does not hold back the
+others. Writes of a failed batch are retried with later flushes; after
+`max_attempts` failures they are logged and handed to `on_dead_letter`
+instead, so the caller can stop serving them.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+
+MONITORING_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../Monitoring"))
+sys.path.append(MONITORING_PATH)
+
+from tracing import trace
+
+logger = logging.getLogger(__name__)
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+class WriteBuffer:
+    """
+    Coalesces upserts and deletes per (namespace, vector id) and flushes them in batches.
+
+    Args:
+        get_store (callable): Returns the vector store to write to.
+        max_batch_size (int): Flush as soon as this many writes are pending.
+        max_wait_ms (float): How long a write may wait for others; 0 writes through.
+        on_flush (callable): Called with the set of namespaces written by each flush.
+        max_attempts (int): Failed flushes of a write before it is dropped.
+        on_dead_letter (callable): Called with (namespace, vector ids) of dropped writes.
+    """
+
+    def __init__(self, get_store, max_batch_size=100, max_wait_ms=20, on_flush=None,
+                 max_attempts=5, on_dead_letter=None):
+        self._get_store = get_store
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.on_flush = on_flush
+        self.max_attempts = max(1, max_attempts)
+        self.on_dead_letter = on_dead_letter
+        self.coalesced = 0
+        self.flushed = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self._pending = {}  # (namespace, vector id) -> (op, vector or None)
+        self._in_flight = {}  # the batch being sent by flush()
+        self._attempts = {}  # (namespace, vector id) -> failed flushes so far
+        self._first_pending_at = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_worker(self):
+        # The worker is started on first use so forked processes get their own
+        if self._thread is None or not self._thread.is_alive():
+            with self._condition:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="vector-write-buffer", daemon=True)
+                    self._thread.start()
+
+    def _submit(self, namespace, entries):
+        if not self.max_wait:
+            with self._condition:
+                self._add(namespace, entries)
+            self.flush()
+            return
+
+        self._ensure_worker()
+        with self._condition:
+            self._add(namespace, entries)
+            if len(self._pending) >= self.max_batch_size:
+                self._condition.notify()
+
+    def _add(self, namespace, entries):
+        for vector_id, op, vector in entries:
+            if (namespace, vector_id) in self._pending:
+                self.coalesced += 1
+            self._pending[(namespace, vector_id)] = (op, vector)
+            self._attempts.pop((namespace, vector_id), None)  # A new write starts over
+        if self._first_pending_at is None:
+            self._first_pending_at = time.monotonic()
+            self._condition.notify()
+
+    def upsert(self, vectors, namespace=""):
+        """
+        Queues (id, values, metadata) vectors; a pending write to the same id is replaced.
+        """
+        self._submit(namespace, [(vector[0], UPSERT, vector) for vector in vectors])
+
+    def delete(self, ids, namespace=""):
+        """
+        Queues deletes; a pending upsert of the same id is dropped.
+        """
+        self._submit(namespace, [(vector_id, DELETE, None) for vector_id in ids])
+
+    def _pending_op(self, namespace, vector_id):
+        key = (namespace, vector_id)
+        pending = self._pending.get(key) or self._in_flight.get(key)
+        return pending[0] if pending is not None else None
+
+    def pending_delete(self, namespace, vector_id):
+        """
+        Returns True if `vector_id` is queued for deletion and not yet flushed.
+        """
+        return self._pending_op(namespace, vector_id) == DELETE
+
+    def pending(self, namespace, vector_id):
+        """
+        Returns True if any write to `vector_id` is queued and not yet flushed.
+        """
+        return self._pending_op(namespace, vector_id) is not None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _batches(self, pending):
+        upserts, deletes = {}, {}
+        for (namespace, vector_id), (op, vector) in pending.items():
+            if op == UPSERT:
+                upserts.setdefault(namespace, []).append(vector)
+            else:
+                deletes.setdefault(namespace, []).append(vector_id)
+        for namespace, vectors in upserts.items():
+            for start in range(0, len(vectors), self.max_batch_size):
+                batch = vectors[start:start + self.max_batch_size]
+                yield UPSERT, namespace, [vector[0] for vector in batch], batch
+        for namespace, ids in deletes.items():
+            yield DELETE, namespace, ids, None
+
+    def _requeue(self, pending, namespace, ids):
+        # Put back what is not superseded yet, so a later flush retries it
+        dead = []
+        with self._condition:
+            for vector_id in ids:
+                key = (namespace, vector_id)
+                attempts = self._attempts.get(key, 0) + 1
+                if key in self._pending:
+                    continue  # A newer write replaces the failed one
+                if attempts >= self.max_attempts:
+                    self._attempts.pop(key, None)
+                    dead.append(vector_id)
+                    continue
+                self._attempts[key] = attempts
+                self._pending[key] = pending[key]
+            if self._pending and self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+        return dead
+
+    def flush(self):
+        """
+        Sends every pending write now and returns how many were sent.
+
+        Every batch is attempted. If any failed, the first error is raised
+        after the others were sent.
+        """
+        with self._flush_lock:
+            with self._condition:
+                pending, self._pending = self._pending, {}
+                self._first_pending_at = None
+            if not pending:
+                return 0
+            self._in_flight = pending
+
+            store = self._get_store()
+            sent, written, error = 0, set(), None
+            try:
+                for op, namespace, ids, vectors in self._batches(pending):
+                    try:
+                        if op == UPSERT:
+                            with trace("vector_upsert"):
+                                store.upsert(vectors=vectors, namespace=namespace)
+                        else:
+                            with trace("vector_delete"):
+                                store.delete(ids=ids, namespace=namespace)
+                    except Exception as e:
+                        error = error or e
+                        self.failed += len(ids)
+                        dead = self._requeue(pending, namespace, ids)
+                        if dead:
+                            self.dead_lettered += len(dead)
+                            logger.error("❌ Dropping %d %s writes to '%s' after %d failed attempts: %s (%s)",
+                                         len(dead), op, namespace, self.max_attempts, ", ".join(dead), e)
+                            if self.on_dead_letter is not None:
+                                self.on_dead_letter(namespace, dead)
+                        continue
+                    sent += len(ids)
+                    written.add(namespace)
+                    with self._condition:
+                        for vector_id in ids:
+                            self._attempts.pop((namespace, vector_id), None)
+            finally:
+                self._in_flight = {}
+
+            self.flushed += sent
+            if written and self.on_flush is not None:
+                self.on_flush(written)
+            if error is not None:
+                raise error
+            return sent
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._first_pending_at is None:
+                    self._condition.wait()
+                # A caller's flush() may empty the buffer while we wait
+                while self._first_pending_at is not None and len(self._pending) < self.max_batch_size:
+                    remaining = self._first_pending_at + self.max_wait - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception("❌ Vector store write failed, retrying: %s", e)
+                time.sleep(max(self.max_wait, 0.5))
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "coalesced": self.coalesced,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "dead_lettered": self.dead_lettered,
+        }
@@ -1,20 +1,30 @@
-import time
+import threading
 
-query_attempts = {}
+from rate_limiter import create_rate_limiter
 
-def detect_anomaly(user_id):
+_rate_limiter = None
+_lock = threading.Lock()
+
+
+def get_rate_limiter():
     """
-    Flags suspicious query activity (e.g., too many requests in a short time).
+    Returns the process-wide rate limiter, created on first use from the
+    RATE_LIMIT_* environment variables (see rate_limiter.py).
     """
-    now = time.time()
-
-    if user_id not in query_attempts:
-        query_attempts[user_id] = []
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _lock:
+            if _rate_limiter is None:
+                _rate_limiter = create_rate_limiter()
+    return _rate_limiter
 
-    query_attempts[user_id].append(now)
 
-    # If user makes more than 5 requests in 10 seconds, flag them
-    if len(query_attempts[user_id]) > 5:
+def detect_anomaly(user_id):
+    """
+    Flags suspicious query activity (e.g., too many requests in a short time).
+    """
+    # By default, more than 5 requests in 10 seconds flags the user
+    if not get_rate_limiter().allow(user_id):
         return f"🚨 ALERT: Possible data scraping attempt by user {user_id}!"
-    
+
     return "Normal activity."
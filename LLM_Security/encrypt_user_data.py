@@ -1,28 +1,120 @@
-import hashlib
+"""
+Per-user encryption of stored values.
+
+Each user's AES-256 key is derived with HKDF-SHA256 from the server secret
+(ENCRYPTION_SECRET) and the user id, and kept in a bounded LRU cache
+(ENCRYPTION_KEY_CACHE_SIZE users), so only the first value of a user pays for
+the derivation. Values are sealed with AES-GCM:
+
+    version (1 byte) | nonce (12) | tag (16) | ciphertext
+
+"binary" encoding returns those bytes as-is; "base64" (the default) returns
+them as text for stores whose metadata must be JSON strings.
+
+Values written by the previous scheme (key = sha256(user_id), AES-EAX, no
+version byte) still decrypt.
+"""
+
 import base64
+import hashlib
+import os
+from functools import lru_cache
+
 from Crypto.Cipher import AES
+from Crypto.Hash import SHA256
+from Crypto.Protocol.KDF import HKDF
+from dotenv import load_dotenv
+
+dotenv_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../Connecting_LLM_VectorDB/.env"))
+load_dotenv(dotenv_path)
+
+ENCRYPTION_SECRET = os.getenv("ENCRYPTION_SECRET")
+ENCRYPTION_KEY_CACHE_SIZE = int(os.getenv("ENCRYPTION_KEY_CACHE_SIZE", "10000"))
+
+FORMAT_VERSION = 1
+KDF_SALT = b"llm-memory/value-encryption/v1"
+NONCE_SIZE = 12
+TAG_SIZE = 16
+ENCODINGS = ("base64", "binary")
+
+
+@lru_cache(maxsize=ENCRYPTION_KEY_CACHE_SIZE)
+def _derive_key(secret, user_id):
+    return HKDF(secret.encode(), 32, KDF_SALT, SHA256, context=user_id.encode())
+
 
 def get_user_encryption_key(user_id):
     """
-    Generates a unique encryption key for each user.
+    Returns the user's 256-bit key, derived from the server secret (cached).
     """
+    if not ENCRYPTION_SECRET:
+        raise RuntimeError("ENCRYPTION_SECRET is not set; it is required to encrypt user data.")
+    return _derive_key(ENCRYPTION_SECRET, user_id)
+
+
+def _legacy_key(user_id):
     return hashlib.sha256(user_id.encode()).digest()
 
-def encrypt_user_data(user_id, data):
+
+def _encode(raw, encoding):
+    if encoding == "binary":
+        return raw
+    if encoding == "base64":
+        return base64.b64encode(raw).decode()
+    raise ValueError(f"Unknown encoding '{encoding}'. Use one of: {', '.join(ENCODINGS)}.")
+
+
+def _seal(key, data):
+    cipher = AES.new(key, AES.MODE_GCM, nonce=os.urandom(NONCE_SIZE))
+    ciphertext, tag = cipher.encrypt_and_digest(data.encode())
+    return bytes([FORMAT_VERSION]) + cipher.nonce + tag + ciphertext
+
+
+def _open(user_id, key, raw):
+    if raw[:1] == bytes([FORMAT_VERSION]):
+        header = 1 + NONCE_SIZE + TAG_SIZE
+        nonce, tag, ciphertext = raw[1:1 + NONCE_SIZE], raw[1 + NONCE_SIZE:header], raw[header:]
+        try:
+            return AES.new(key, AES.MODE_GCM, nonce=nonce).decrypt_and_verify(ciphertext, tag).decode()
+        except ValueError:
+            pass  # A legacy value whose random nonce happens to start with the version byte
+
+    # Legacy layout: nonce (16) | tag (16) | ciphertext, AES-EAX under sha256(user_id)
+    nonce, tag, ciphertext = raw[:16], raw[16:32], raw[32:]
+    cipher = AES.new(_legacy_key(user_id), AES.MODE_EAX, nonce=nonce)
+    return cipher.decrypt_and_verify(ciphertext, tag).decode()
+
+
+def encrypt_user_data(user_id, data, encoding="base64"):
     """
     Encrypts sensitive user data using a per-user key.
     """
-    key = get_user_encryption_key(user_id)
-    cipher = AES.new(key, AES.MODE_EAX)
-    ciphertext, tag = cipher.encrypt_and_digest(data.encode())
-    return base64.b64encode(cipher.nonce + tag + ciphertext).decode()
+    return _encode(_seal(get_user_encryption_key(user_id), data), encoding)
+
 
 def decrypt_user_data(user_id, encrypted_data):
     """
-    Decrypts the encrypted data using the user's unique key.
+    Decrypts data produced by encrypt_user_data (either encoding) or by the
+    legacy scheme. Raises ValueError if it was tampered with.
+    """
+    raw = encrypted_data if isinstance(encrypted_data, bytes) else base64.b64decode(encrypted_data)
+    return _open(user_id, get_user_encryption_key(user_id), raw)
+
+
+def encrypt_many(user_id, values, encoding="base64"):
+    """
+    Encrypts several values for one user, deriving the key once.
     """
     key = get_user_encryption_key(user_id)
-    raw_data = base64.b64decode(encrypted_data)
-    nonce, tag, ciphertext = raw_data[:16], raw_data[16:32], raw_data[32:]
-    cipher = AES.new(key, AES.MODE_EAX, nonce=nonce)
-    return cipher.decrypt_and_verify(ciphertext, tag).decode()
+    return [_encode(_seal(key, value), encoding) for value in values]
+
+
+def decrypt_many(user_id, encrypted_values):
+    """
+    Decrypts several values for one user, deriving the key once.
+    """
+    key = get_user_encryption_key(user_id)
+    return [
+        _open(user_id, key, value if isinstance(value, bytes) else base64.b64decode(value))
+        for value in encrypted_values
+    ]
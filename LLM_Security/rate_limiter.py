@@ -0,0 +1,226 @@
+"""
+Per-user rate limiting for search requests.
+
+Two algorithms, both constant memory per user:
+
+    - "sliding_window": sliding-window counter (current + previous window count)
+    - "token_bucket":   `limit` tokens refilled evenly over `window` seconds
+
+State lives in a backend. LocalBackend keeps it in-process, evicting idle
+users. RedisBackend shares it between workers so limits hold across the whole
+deployment. Configure with:
+
+    RATE_LIMIT_MODE            sliding_window (default) or token_bucket
+    RATE_LIMIT_MAX_REQUESTS    requests allowed per window (default 5)
+    RATE_LIMIT_WINDOW_SECONDS  window length (default 10)
+    RATE_LIMIT_BACKEND         local (default) or redis
+    RATE_LIMIT_REDIS_URL       redis://host:6379/0 for the redis backend
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalBackend:
+    """
+    Thread-safe in-process state store.
+
+    Users untouched for `idle_ttl` seconds are evicted, and at most `max_keys`
+    users are tracked (least recently seen go first).
+    """
+
+    def __init__(self, max_keys=100000, idle_ttl=3600, clock=time.time):
+        self.max_keys = max_keys
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def atomic_update(self, key, step):
+        """
+        Applies step(state) -> (new_state, result) atomically and returns result.
+        """
+        with self._lock:
+            now = self.clock()
+            entry = self._states.pop(key, None)
+            new_state, result = step(entry[0] if entry else None)
+            self._states[key] = (new_state, now)
+
+            while self._states:
+                oldest_key, (_, touched) = next(iter(self._states.items()))
+                if len(self._states) <= self.max_keys and now - touched <= self.idle_ttl:
+                    break
+                del self._states[oldest_key]
+            return result
+
+    def clear(self, key=None):
+        with self._lock:
+            if key is None:
+                self._states.clear()
+            else:
+                self._states.pop(key, None)
+
+    def __len__(self):
+        return len(self._states)
+
+
+class RedisBackend:
+    """
+    Shared state store on Redis using optimistic WATCH/MULTI transactions.
+
+    Keys expire after `idle_ttl` seconds, which doubles as idle eviction.
+    """
+
+    def __init__(self, client, prefix="ratelimit:", idle_ttl=3600):
+        self.client = client
+        self.prefix = prefix
+        self.idle_ttl = idle_ttl
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def atomic_update(self, key, step):
+        from redis.exceptions import WatchError
+
+        redis_key = self.prefix + key
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(redis_key)
+                    raw = pipe.get(redis_key)
+                    new_state, result = step(json.loads(raw) if raw else None)
+                    pipe.multi()
+                    pipe.set(redis_key, json.dumps(new_state), ex=self.idle_ttl)
+                    pipe.execute()
+                    return result
+                except WatchError:
+                    continue  # Another worker updated this user first; retry
+
+    def clear(self, key=None):
+        if key is None:
+            for redis_key in self.client.scan_iter(self.prefix + "*"):
+                self.client.delete(redis_key)
+        else:
+            self.client.delete(self.prefix + key)
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window counter: the previous window's count is weighted by how much
+    of it still overlaps the sliding window. State is [window_start, count, previous_count].
+    """
+
+    def __init__(self, limit, window, clock=time.time):
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+
+    def step(self, state):
+        now = self.clock()
+        current_start = now - (now % self.window)
+
+        if state is None:
+            window_start, count, previous = current_start, 0, 0
+        else:
+            window_start, count, previous = state
+            if current_start - window_start >= 2 * self.window:
+                previous, count = 0, 0
+            elif current_start != window_start:
+                previous, count = count, 0
+            window_start = current_start
+
+        overlap = 1 - (now - window_start) / self.window
+        allowed = previous * overlap + count < self.limit
+        if allowed:
+            count += 1
+        return [window_start, count, previous], allowed
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket holding up to `limit` tokens, refilled at limit/window per
+    second. State is [tokens, last_refill].
+    """
+
+    def __init__(self, limit, window, clock=time.time):
+        self.limit = limit
+        self.rate = limit / window
+        self.clock = clock
+
+    def step(self, state):
+        now = self.clock()
+        tokens, last = state if state is not None else (self.limit, now)
+        tokens = min(self.limit, tokens + (now - last) * self.rate)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        return [tokens, now], allowed
+
+
+LIMITERS = {
+    "sliding_window": SlidingWindowLimiter,
+    "token_bucket": TokenBucketLimiter,
+}
+
+
+class RateLimiter:
+    """
+    Applies one algorithm per user, with optional per-user limits.
+
+    Args:
+        mode (str): "sliding_window" or "token_bucket".
+        limit (int): Requests allowed per window.
+        window (float): Window length in seconds.
+        backend: LocalBackend or RedisBackend (defaults to a new LocalBackend).
+    """
+
+    def __init__(self, mode="sliding_window", limit=5, window=10, backend=None, clock=time.time):
+        if mode not in LIMITERS:
+            raise ValueError(f"Unknown rate limit mode '{mode}'. Use one of: {', '.join(LIMITERS)}.")
+        self.mode = mode
+        self.clock = clock
+        self.backend = backend if backend is not None else LocalBackend(clock=clock)
+        self.default = LIMITERS[mode](limit, window, clock)
+        self._overrides = {}
+
+    def set_user_limit(self, user_id, limit, window):
+        """
+        Gives one user their own limit (e.g. a service account).
+        """
+        self._overrides[user_id] = LIMITERS[self.mode](limit, window, self.clock)
+
+    def allow(self, user_id):
+        """
+        Records a request and returns True if the user is within their limit.
+        """
+        limiter = self._overrides.get(user_id, self.default)
+        return self.backend.atomic_update(str(user_id), limiter.step)
+
+    def reset(self, user_id=None):
+        self.backend.clear(None if user_id is None else str(user_id))
+
+
+def create_rate_limiter():
+    """
+    Builds the limiter configured by the RATE_LIMIT_* environment variables.
+    """
+    mode = os.getenv("RATE_LIMIT_MODE", "sliding_window")
+    limit = int(os.getenv("RATE_LIMIT_MAX_REQUESTS", "5"))
+    window = float(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "10"))
+
+    backend_name = os.getenv("RATE_LIMIT_BACKEND", "local").strip().lower()
+    if backend_name == "redis":
+        backend = RedisBackend.from_url(os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+    elif backend_name == "local":
+        backend = LocalBackend()
+    else:
+        raise ValueError(f"Unknown rate limit backend '{backend_name}'. Use 'local' or 'redis'.")
+
+    return RateLimiter(mode, limit, window, backend)
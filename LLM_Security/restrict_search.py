@@ -1,6 +1,10 @@
+import logging
 import os
+import sys
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
-from pinecone import Pinecone
 import jwt
 from flask import request
 import datetime
@@ -8,44 +12,133 @@ import datetime
 dotenv_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../Connecting_LLM_VectorDB/.env"))
 load_dotenv(dotenv_path)
 
-# Load Pinecone API key
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+# Share the process-wide vector store client instead of opening a second one
+VECTORDB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../Connecting_LLM_VectorDB"))
+sys.path.append(VECTORDB_PATH)
 
-# ✅ NEW PINECONE INITIALIZATION (CORRECT)
-pc = Pinecone(api_key=PINECONE_API_KEY)
+from model_registry import get_vector_store
 
-# Connect to existing index
-index_name = "text-search"
-if index_name not in pc.list_indexes().names():
-    raise ValueError(f"Index '{index_name}' does not exist. Please create it in Pinecone console.")
+logger = logging.getLogger(__name__)
+
+# Loaded once; call rotate_jwt_secret() after changing it
+JWT_SECRET = os.getenv("JWT_SECRET", "your_default_secret_key")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Upper bound on how long a verified token is trusted without re-checking (tokens without exp)
+TOKEN_CACHE_MAX_TTL = float(os.getenv("TOKEN_CACHE_MAX_TTL", "3600"))
+# Development only: accept the user named in the request when no valid token is sent
+AUTH_TRUST_BODY_USER = os.getenv("AUTH_TRUST_BODY_USER", "").lower() in ("1", "true", "yes")
+
+
+class VerifiedTokenCache:
+    """
+    Bounded map from verified token to user id. Entries expire with the
+    token's `exp` claim, and the least recently used go first when full.
+    """
+
+    def __init__(self, max_entries=TOKEN_CACHE_SIZE, max_ttl=TOKEN_CACHE_MAX_TTL, clock=time.time):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[1] > self.clock():
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[token]
+            self.misses += 1
+            return None
+
+    def put(self, token, user_id, exp=None):
+        expires_at = self.clock() + self.max_ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        with self._lock:
+            self._entries[token] = (user_id, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+token_cache = VerifiedTokenCache()
+
+
+def rotate_jwt_secret(secret=None):
+    """
+    Switches to a new signing secret (default: re-read JWT_SECRET from the
+    environment) and drops every token verified under the old one.
+    """
+    global JWT_SECRET
+    JWT_SECRET = secret or os.getenv("JWT_SECRET", "your_default_secret_key")
+    token_cache.clear()
 
-index = pc.Index(index_name)
 
 def verify_token(token):
     """
     Verifies that the incoming request is authenticated.
     Extracts the user ID from the token.
+
+    Tokens verified before are answered from token_cache until they expire.
     """
-    SECRET_KEY = os.getenv("JWT_SECRET", "your_default_secret_key")    
     if not token:
         return None
 
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+
     try:
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        return decoded.get("user_id")
+        decoded = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
     except jwt.ExpiredSignatureError:
-        print("❌ Token expired!")
+        logger.info("❌ Token expired!")
         return None
     except jwt.InvalidTokenError:
-        print("❌ Invalid token!")
+        logger.info("❌ Invalid token!")
+        return None
+
+    user_id = decoded.get("user_id")
+    if user_id is not None:
+        token_cache.put(token, user_id, decoded.get("exp"))
+    return user_id
+
+
+def user_from_authorization(header):
+    """
+    Returns the user id for an "Authorization: Bearer <token>" header value, or None.
+    """
+    scheme, _, token = (header or "").partition(" ")
+    if scheme.lower() != "bearer":
         return None
+    return verify_token(token.strip())
+
+
+def authenticate_request():
+    """
+    Returns the user id of the current Flask request's bearer token, or None.
+    """
+    return user_from_authorization(request.headers.get("Authorization"))
 
 def get_vector_search_results(user_id, query_embedding, top_k=5):
     """
     Searches only within the authenticated user's stored embeddings.
     """
     user_namespace = f"user_{user_id}"  # Restrict search to user-specific data
-    results = index.query(queries=[query_embedding], top_k=top_k, namespace=user_namespace)
+    results = get_vector_store().query(vector=query_embedding, top_k=top_k, namespace=user_namespace)
     return results
 
 import datetime
@@ -64,8 +157,7 @@ def generate_token(user_id):
         "user_id": user_id,
         "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=1)  # Token expires in 1 hour
     }
-    SECRET_KEY = os.getenv("JWT_SECRET", "your_default_secret_key")
-    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+    return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
 
 if __name__ == "__main__":
     test_user = "test_user_123"
@@ -0,0 +1,179 @@
+"""
+Lightweight per-stage latency tracing for the /chat pipeline.
+
+Stages are timed with `trace("embedding")` (a context manager) or the
+`@traced("embedding")` decorator and recorded into fixed-bucket histograms.
+`render_prometheus()` produces the text served on /metrics, and `snapshot()`
+gives count, mean and p50/p95/p99 estimates per stage for benchmarks.
+
+Components can also publish counters (cache hits, index sizes) with
+`register_gauges(name, callback)`; callbacks are evaluated at scrape time.
+"""
+
+import bisect
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; tuned for sub-millisecond cache hits up to multi-second cold starts
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    """
+    Thread-safe fixed-bucket latency histogram.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[slot] += 1
+            self.total += seconds
+            self.count += 1
+
+    def quantile(self, q):
+        """
+        Estimates the q-quantile by linear interpolation inside its bucket.
+        """
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+        if not count:
+            return 0.0
+
+        rank = q * count
+        seen = 0
+        for slot, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[slot - 1] if slot > 0 else 0.0
+                upper = self.buckets[slot] if slot < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class StageMetrics:
+    """
+    Named histograms (one per pipeline stage) plus gauge callbacks.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, stage, seconds):
+        self.histogram(stage).observe(seconds)
+
+    def register_gauges(self, name, callback):
+        """
+        Publishes the numeric values of callback() (a dict) as `{name}_{key}` gauges.
+        """
+        self._gauges[name] = callback
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def snapshot(self):
+        """
+        Returns {stage: {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"}}.
+        """
+        stats = {}
+        for stage, histogram in sorted(self._histograms.items()):
+            stats[stage] = {
+                "count": histogram.count,
+                "mean_ms": histogram.total / histogram.count * 1e3 if histogram.count else 0.0,
+                "p50_ms": histogram.quantile(0.50) * 1e3,
+                "p95_ms": histogram.quantile(0.95) * 1e3,
+                "p99_ms": histogram.quantile(0.99) * 1e3,
+            }
+        return stats
+
+    def render_prometheus(self):
+        """
+        Renders all histograms and gauges in the Prometheus text format.
+        """
+        lines = [
+            "# HELP chat_stage_latency_seconds Latency of /chat pipeline stages.",
+            "# TYPE chat_stage_latency_seconds histogram",
+        ]
+        for stage, histogram in sorted(self._histograms.items()):
+            with histogram._lock:
+                counts = list(histogram.counts)
+                total, count = histogram.total, histogram.count
+            cumulative = 0
+            for bucket, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'chat_stage_latency_seconds_bucket{{stage="{stage}",le="{bucket}"}} {cumulative}')
+            lines.append(f'chat_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'chat_stage_latency_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'chat_stage_latency_seconds_count{{stage="{stage}"}} {count}')
+
+        for name, callback in sorted(self._gauges.items()):
+            try:
+                values = callback()
+            except Exception:
+                continue  # A broken gauge must not break the scrape
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {name}_{key} gauge")
+                    lines.append(f"{name}_{key} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide metrics shared by every module
+metrics = StageMetrics()
+
+
+@contextmanager
+def trace(stage):
+    """
+    Times the enclosed block and records it under `stage`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe(stage, time.perf_counter() - start)
+
+
+def traced(stage):
+    """
+    Decorator form of trace(); works for both plain and async functions.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with trace(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
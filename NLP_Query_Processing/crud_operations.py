@@ -1,7 +1,5 @@
-import spacy
-
-# Load NLP model
-nlp = spacy.load("en_core_web_sm")
+import os
+import re
 
 # Define intent categories based on key action words
 intent_keywords = {
@@ -11,22 +9,87 @@ intent_keywords = {
     "delete_memory": ["@delete"]  # Remove stored values
 }
 
+# Set INTENT_CLASSIFIER=spacy to match keywords on spaCy lemmas instead of raw text
+INTENT_CLASSIFIER = os.getenv("INTENT_CLASSIFIER", "keywords").strip().lower()
+
+_nlp = None
+_keyword_pattern = None
+_keyword_intents = {}
+_intent_priority = {}
+
+
+def compile_intent_matcher():
+    """
+    Compiles intent_keywords into one regex that finds every keyword in a
+    single pass. Call again after changing intent_keywords at runtime.
+    """
+    global _keyword_pattern, _keyword_intents, _intent_priority
+
+    _intent_priority = {intent: rank for rank, intent in enumerate(intent_keywords)}
+    _keyword_intents = {}
+    for intent, keywords in intent_keywords.items():
+        for keyword in keywords:
+            _keyword_intents.setdefault(keyword, intent)
+
+    # Longest first so a keyword that contains another one wins the match
+    alternatives = "|".join(re.escape(k) for k in sorted(_keyword_intents, key=len, reverse=True))
+    _keyword_pattern = re.compile(alternatives)
+
+
+compile_intent_matcher()
+
+
+def _get_nlp():
+    global _nlp
+    if _nlp is None:
+        import spacy
+
+        # Load NLP model
+        _nlp = spacy.load("en_core_web_sm")
+    return _nlp
+
+
+def warm_up():
+    """
+    Loads the spaCy model up front when INTENT_CLASSIFIER=spacy.
+    """
+    if INTENT_CLASSIFIER == "spacy":
+        _get_nlp()
+
+
+def _intent_from_keywords(found):
+    if not found:
+        return None
+    return min((_keyword_intents[keyword] for keyword in found), key=_intent_priority.__getitem__)
+
+
+def _detect_intent_spacy(query):
+    """
+    Richer classifier: command keywords still match on the raw text, while the
+    other keywords match whole-word lemmas ("showed", "fetching").
+    """
+    commands = {k for k in _keyword_pattern.findall(query) if k.startswith("@")}
+    doc = _get_nlp()(query.lower())
+    words = {token.lemma_ for token in doc} | {token.text for token in doc}
+    return _intent_from_keywords(commands | (words & _keyword_intents.keys()))
+
+
 def detect_intent(query):
     """
     Detects user intent based on keywords in their query.
-    
+
     Args:
         query (str): User's input text.
 
     Returns:
         str: The detected intent (store_memory, update_memory, delete_memory, retrieve_memory, or unknown).
     """
-    doc = nlp(query.lower())  # Convert text to lowercase for uniform processing
-
-    # Check for command-based keywords (@store, @update, @delete)
-    for intent, keywords in intent_keywords.items():
-        if any(keyword in query for keyword in keywords):
-            return intent  # Return matched intent
+    if INTENT_CLASSIFIER == "spacy":
+        intent = _detect_intent_spacy(query)
+    else:
+        # Check for command-based keywords (@store, @update, @delete) in one scan;
+        # when several match, the first intent in intent_keywords wins
+        intent = _intent_from_keywords(set(_keyword_pattern.findall(query)))
 
     # If no command is found, assume it's a retrieval query (retrieve_memory)
-    return "retrieve_memory"  # By default, assume the user wants to retrieve stored data
\ No newline at end of file
+    return intent or "retrieve_memory"  # By default, assume the user wants to retrieve stored data
@@ -0,0 +1,112 @@
+"""
+Fuzzy key matching with a character trigram inverted index.
+
+difflib.get_close_matches compares the query with every stored key. Here each
+key is split into padded character trigrams once, when it is stored. A lookup
+then only scores keys that share trigrams with the query: it counts shared
+trigrams to shortlist candidates and re-scores the shortlist with difflib's
+ratio, so scores and cutoffs mean the same as before.
+"""
+
+import heapq
+import threading
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+
+def trigrams(text, n=3):
+    """
+    Returns the set of padded character n-grams of `text`.
+    """
+    padded = f"{' ' * (n - 1)}{text} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class FuzzyKeyIndex:
+    """
+    Trigram inverted index over one user's keys, updated incrementally.
+
+    Args:
+        keys (iterable): Optional initial keys.
+        shortlist_size (int): How many trigram candidates are re-scored with difflib.
+        common_gram_limit (int): Posting lists longer than this (and than 5% of
+            the keys) may be skipped while counting.
+    """
+
+    def __init__(self, keys=(), shortlist_size=32, common_gram_limit=1000):
+        self.shortlist_size = shortlist_size
+        self.common_gram_limit = common_gram_limit
+        self._grams = {}
+        self._postings = defaultdict(set)
+        self._lock = threading.Lock()
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key):
+        return key in self._grams
+
+    def __len__(self):
+        return len(self._grams)
+
+    def keys(self):
+        return list(self._grams)
+
+    def add(self, key):
+        with self._lock:
+            if key in self._grams:
+                return
+            grams = trigrams(key)
+            self._grams[key] = grams
+            for gram in grams:
+                self._postings[gram].add(key)
+
+    def remove(self, key):
+        with self._lock:
+            grams = self._grams.pop(key, None)
+            for gram in grams or ():
+                keys = self._postings.get(gram)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._postings[gram]
+
+    def search(self, query, k=1, cutoff=0.5):
+        """
+        Returns up to `k` (key, score) pairs with score >= cutoff, best first.
+
+        Scores are difflib SequenceMatcher ratios, as get_close_matches uses.
+        """
+        if query in self._grams:
+            return [(query, 1.0)]
+
+        query_grams = trigrams(query)
+        with self._lock:
+            # Very common trigrams ("  p", "er ") say little about which key is
+            # meant but dominate the counting, so they are skipped once the
+            # rarer half of the query's trigrams has been counted
+            postings = sorted((self._postings.get(gram, ()) for gram in query_grams), key=len)
+            common_limit = max(self.common_gram_limit, len(self._grams) // 20)
+            shared = Counter()
+            for rank, keys in enumerate(postings):
+                if len(keys) > common_limit and rank >= len(postings) // 2:
+                    break
+                shared.update(keys)
+
+            # Dice coefficient on trigram sets to shortlist candidates
+            shortlist = heapq.nlargest(
+                max(k, self.shortlist_size),
+                shared.items(),
+                key=lambda item: 2 * item[1] / (len(query_grams) + len(self._grams[item[0]])),
+            )
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(query)
+        scored = []
+        for key, _ in shortlist:
+            matcher.set_seq1(key)
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                score = matcher.ratio()
+                if score >= cutoff:
+                    scored.append((key, score))
+
+        return heapq.nlargest(k, scored, key=lambda item: item[1])
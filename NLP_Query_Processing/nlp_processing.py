@@ -1,15 +1,16 @@
+import logging
 import os
-import string
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
 from dotenv import load_dotenv
-import re
 
+from text_normalization import (
+    normalize, normalize_many, COMMAND_PATTERN, STATEMENT_SPLIT_PATTERN, KEY_VALUE_PATTERN, POSSESSIVE_KEY_PATTERN,
+    QUESTION_PREFIX_PATTERN, LEADING_MY_PATTERN, KEY_FILLER_PATTERN, QUESTION_SPLIT_PATTERN, RELATION_KEY_PATTERN
+)
 
-# Download necessary NLP resources
-nltk.download("punkt")
-nltk.download("stopwords")
+# NLTK data is resolved offline on first use (see nlp_resources.py); nothing
+# is downloaded at import time
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 env_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../Setting_up_LLM/.env"))
@@ -29,12 +30,19 @@ def preprocess_query(query):
     Returns:
         str: Processed text with only important words.
     """
-    query = re.sub(r"\b(\w+)'s\b", r"\1", query)
-    query = query.lower()  # Convert to lowercase
-    query = query.translate(str.maketrans("", "", string.punctuation))  # Remove punctuation
-    words = word_tokenize(query)  # Tokenize
-    filtered_words = [word for word in words if word not in stopwords.words("english")]  # Remove stopwords
-    return " ".join(filtered_words)  # Convert list back to string
+    return normalize(query)  # Precompiled and memoized, see text_normalization.py
+
+def preprocess_queries(queries):
+    """
+    Preprocesses a list of queries in one call (see preprocess_query).
+
+    Args:
+        queries (list): The users' input texts.
+
+    Returns:
+        list: Processed text for each query, in input order.
+    """
+    return normalize_many(queries)
 
 def extract_key_value(user_input):
     """
@@ -44,19 +52,19 @@ def extract_key_value(user_input):
         "My wife's SSN is 987-65-4321" → ("ssn", "987-65-4321", "wife")
         "Dad's birthday is June 4th" → ("birthday", "June 4th", "dad")
     """
-    print(f"📝 DEBUG: Raw User Input: {user_input}")
+    logger.debug("📝 Raw User Input: %s", user_input)
 
-    cleaned_input = user_input.replace("@store", "").replace("@update", "").replace("@delete", "").strip()
+    cleaned_input = COMMAND_PATTERN.sub("", user_input).strip()
     if cleaned_input.lower().startswith("my "):
         cleaned_input = cleaned_input[3:].strip()
-    print(f"📝 DEBUG: Cleaned Input: {cleaned_input}")
+    logger.debug("📝 Cleaned Input: %s", cleaned_input)
 
     key_value_relation = []
 
-    statements = re.split(r"\s+and\s+", cleaned_input)
+    statements = STATEMENT_SPLIT_PATTERN.split(cleaned_input)
 
     for statement in statements:
-        match = re.search(r"(.*?)(?:is|to|=)\s*(.*)", statement, re.IGNORECASE)
+        match = KEY_VALUE_PATTERN.search(statement)
         if match:
             raw_key = match.group(1).strip().lower()
             value = match.group(2).strip()
@@ -65,12 +73,12 @@ def extract_key_value(user_input):
             key = raw_key
 
             # Try to extract relationship from possessive (e.g. "wife's SSN")
-            possessive_match = re.match(r"(\w+)'s\s+(.*)", raw_key)
+            possessive_match = POSSESSIVE_KEY_PATTERN.match(raw_key)
             if possessive_match:
                 relation = possessive_match.group(1).lower()  # "wife"
                 key = possessive_match.group(2).strip()       # "ssn"
 
-            print(f"📝 DEBUG: Extracted → key: {key}, value: {value}, relation: {relation}")
+            logger.debug("📝 Extracted → key: %s, value: %s, relation: %s", key, value, relation)
             key_value_relation.append((key, value, relation))
 
     return key_value_relation if key_value_relation else None
@@ -83,11 +91,11 @@ def extract_key_for_retrieval(user_input):
     cleaned = user_input.strip().lower()
 
     # Remove leading question words, helpers, and 'my'
-    cleaned = re.sub(r"^(what's|what|tell me|when does|where is|how does|who has|can you|do you know)[\s,]+", '', cleaned)
-    cleaned = re.sub(r'^my\s+', '', cleaned)
+    cleaned = QUESTION_PREFIX_PATTERN.sub('', cleaned)
+    cleaned = LEADING_MY_PATTERN.sub('', cleaned)
 
     # Try to extract relation from possessive (e.g., "wife's passport")
-    possessive_match = re.match(r"(\w+)'s\s+(.*)", cleaned)
+    possessive_match = POSSESSIVE_KEY_PATTERN.match(cleaned)
     if possessive_match:
         relation = possessive_match.group(1)
         key = possessive_match.group(2)
@@ -96,12 +104,28 @@ def extract_key_for_retrieval(user_input):
         relation = None
 
     # Additional cleanup: strip out junk and trailing punctuation
-    key = re.sub(r'^(is|my|the)\s+', '', key, flags=re.IGNORECASE).strip()
+    key = KEY_FILLER_PATTERN.sub('', key).strip()
     key = key.rstrip('?.!').strip()
 
     return key, relation
 
 
+def extract_keys_for_retrieval(user_input):
+    """
+    Extracts every (key, relation) pair a compound question asks for.
+
+    Example:
+        "Tell me my passport number and my wife's birthday"
+        → [("passport number", None), ("birthday", "wife")]
+    """
+    targets = []
+    for part in QUESTION_SPLIT_PATTERN.split(user_input.strip()):
+        key, relation = extract_key_for_retrieval(part)
+        if key and (key, relation) not in targets:
+            targets.append((key, relation))
+    return targets
+
+
 def clean_query_text(query):
     """
     Cleans query text by removing unnecessary words like 'my'
@@ -123,10 +147,16 @@ def build_storage_key(key, relation=None):
     """
     Combines relation and key to form a standardized storage key.
     For example, "passport number" + "wife" => "wife passport number"
+
+    Keys that already start with the relation are returned unchanged, so
+    building a key twice does not give "wife wife passport number".
     """
     key = key.strip().lower()
     if relation:
-        return f"{relation.strip().lower()} {key}"
+        relation = relation.strip().lower()
+        if key == relation or key.startswith(relation + " "):
+            return key
+        return f"{relation} {key}"
     return key
 
 def extract_relation_and_key(query):
@@ -134,7 +164,7 @@ def extract_relation_and_key(query):
     Extracts relation and key from user input.
     Example: "my wife's passport number" → ("wife", "passport number")
     """
-    match = re.match(r"(?:my\s+)?(\w+)'s\s+(.*)", query.strip(), re.IGNORECASE)
+    match = RELATION_KEY_PATTERN.match(query.strip())
     if match:
         return match.group(1).lower(), match.group(2).lower()
     return None, query.lower()
@@ -0,0 +1,143 @@
+"""
+Offline-first loader for the NLTK data used by text normalization.
+
+Nothing here touches the network at import time. Tokenizer and stopword data
+are resolved from NLTK_DATA_DIR (default: the vendored
+NLP_Query_Processing/nltk_data directory) and NLTK's usual search path, and
+are checked once per process. When punkt is missing, a pure-regex tokenizer
+is used; when the stopwords corpus is missing, the bundled English list is.
+
+To vendor the data on a machine with network access (e.g. at image build):
+
+    python NLP_Query_Processing/nlp_resources.py --download
+"""
+
+import argparse
+import logging
+import os
+import re
+import threading
+
+import nltk
+
+NLTK_DATA_DIR = os.getenv(
+    "NLTK_DATA_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "nltk_data"))
+)
+
+# Resource name -> paths accepted by nltk.data.find. punkt is probed by
+# tokenizing instead (see _punkt_available)
+NLTK_RESOURCES = {
+    "stopwords": ["corpora/stopwords"],
+}
+
+# NLTK's English stopword list, used when the corpus is not available
+ENGLISH_STOPWORDS = (
+    "i me my myself we our ours ourselves you you're you've you'll you'd your yours yourself "
+    "yourselves he him his himself she she's her hers herself it it's its itself they them "
+    "their theirs themselves what which who whom this that that'll these those am is are was "
+    "were be been being have has had having do does did doing a an the and but if or because "
+    "as until while of at by for with about against between into through during before after "
+    "above below to from up down in out on off over under again further then once here there "
+    "when where why how all any both each few more most other some such no nor not only own "
+    "same so than too very s t can will just don don't should should've now d ll m o re ve y "
+    "ain aren aren't couldn couldn't didn didn't doesn doesn't hadn hadn't hasn hasn't haven "
+    "haven't isn isn't ma mightn mightn't mustn mustn't needn needn't shan shan't shouldn "
+    "shouldn't wasn wasn't weren weren't won won't wouldn wouldn't"
+).split()
+
+TOKEN_PATTERN = re.compile(r"\w+(?:'\w+)?|[^\w\s]")
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_available = None
+
+if NLTK_DATA_DIR not in nltk.data.path:
+    nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+
+def _find(paths):
+    for path in paths:
+        try:
+            nltk.data.find(path)
+            return True
+        except LookupError:
+            continue
+    return False
+
+
+def _punkt_available():
+    # Which punkt data word_tokenize loads depends on the NLTK version (NLTK
+    # >= 3.8.2 only reads punkt_tab, not the legacy punkt pickle), so ask it
+    from nltk.tokenize import word_tokenize
+
+    try:
+        word_tokenize("x")
+        return True
+    except LookupError:
+        return False
+
+
+def resource_status():
+    """
+    Returns {resource name: available} for the NLTK data we use, checked once.
+    """
+    global _available
+    if _available is None:
+        with _lock:
+            if _available is None:
+                _available = {"punkt": _punkt_available()}
+                _available.update({name: _find(paths) for name, paths in NLTK_RESOURCES.items()})
+                missing = [name for name, ok in _available.items() if not ok]
+                if missing:
+                    logger.warning("⚠️ NLTK data not found in %s: %s. Using built-in fallbacks.", NLTK_DATA_DIR, ", ".join(missing))
+    return _available
+
+
+def regex_tokenize(text):
+    """
+    Splits text into word and punctuation tokens without any NLTK data.
+    """
+    return TOKEN_PATTERN.findall(text)
+
+
+def get_tokenizer():
+    """
+    Returns nltk.word_tokenize when punkt is available, otherwise regex_tokenize.
+    """
+    if resource_status()["punkt"]:
+        from nltk.tokenize import word_tokenize
+
+        return word_tokenize
+    return regex_tokenize
+
+
+def get_stopword_list():
+    """
+    Returns the English stopwords from the NLTK corpus, or the bundled list.
+    """
+    if resource_status()["stopwords"]:
+        from nltk.corpus import stopwords
+
+        return stopwords.words("english")
+    return list(ENGLISH_STOPWORDS)
+
+
+def download_resources(directory=NLTK_DATA_DIR):
+    """
+    Downloads punkt and stopwords into `directory`. Never called at import.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for package in ("punkt", "punkt_tab", "stopwords"):
+        nltk.download(package, download_dir=directory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check or vendor the NLTK data used by nlp_processing.")
+    parser.add_argument("--download", action="store_true", help=f"download the data into {NLTK_DATA_DIR}")
+    args = parser.parse_args()
+
+    if args.download:
+        download_resources()
+    for name, ok in resource_status().items():
+        print(f"{'✅' if ok else '❌'} {name}")
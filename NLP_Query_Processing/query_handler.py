@@ -1,13 +1,78 @@
+import logging
+import threading
+from collections import OrderedDict
 from difflib import get_close_matches
+
 from nlp_processing import clean_query_text
+from fuzzy_keys import FuzzyKeyIndex
+
+logger = logging.getLogger(__name__)
+
+# Per-user fuzzy key indexes, built on a user's first fuzzy lookup and then
+# kept current by remember_key/forget_key. Only the most recently used
+# MAX_FUZZY_INDEXES users are kept; an evicted user's index is rebuilt.
+MAX_FUZZY_INDEXES = 10000
+_fuzzy_indexes = OrderedDict()
+_fuzzy_lock = threading.Lock()
+
+def get_fuzzy_index(user, stored_keys=()):
+    """
+    Returns the user's fuzzy key index, building it from `stored_keys` if
+    this process has none for the user yet.
+
+    Args:
+        user (str): User identifier.
+        stored_keys (iterable): The user's current keys.
+
+    Returns:
+        FuzzyKeyIndex: The user's index.
+    """
+    with _fuzzy_lock:
+        index = _fuzzy_indexes.get(user)
+        if index is not None:
+            _fuzzy_indexes.move_to_end(user)
+            return index
+
+    index = FuzzyKeyIndex(stored_keys)
+    with _fuzzy_lock:
+        # Another thread may have built one meanwhile; keep the first
+        index = _fuzzy_indexes.setdefault(user, index)
+        _fuzzy_indexes.move_to_end(user)
+        while len(_fuzzy_indexes) > MAX_FUZZY_INDEXES:
+            _fuzzy_indexes.popitem(last=False)
+    return index
+
+def _existing_index(user):
+    with _fuzzy_lock:
+        return _fuzzy_indexes.get(user)
+
+def remember_key(user, user_memory, key, value):
+    """
+    Stores `value` under `key` in `user_memory` and indexes the key.
+    """
+    user_memory.setdefault(user, {}).setdefault(key, []).append(value)
+    index = _existing_index(user)
+    if index is not None:
+        index.add(key)
+
+def forget_key(user, user_memory, key):
+    """
+    Removes `key` from `user_memory` and from the user's index.
+    """
+    user_memory.get(user, {}).pop(key, None)
+    index = _existing_index(user)
+    if index is not None:
+        index.remove(key)
 
-def find_closest_key(user_input, stored_keys):
+def find_closest_key(user_input, stored_keys, index=None):
     """
     Finds the closest matching key from stored user memory.
 
     Args:
         user_input (str): The key the user is looking for.
         stored_keys (list): List of all available keys in memory.
+        index (FuzzyKeyIndex): Optional index over stored_keys; without one
+            the keys are scanned with difflib.
 
     Returns:
         str: The closest matching key or None if no match is found.
@@ -19,11 +84,18 @@ def find_closest_key(user_input, stored_keys):
         return user_input
 
     # ✅ Try fuzzy matching
-    matches = get_close_matches(user_input, stored_keys, n=1, cutoff=0.5)
+    if index is None:
+        matches = get_close_matches(user_input, list(stored_keys), n=1, cutoff=0.5)
+        return matches[0] if matches else None
 
-    if matches:
-        return matches[0]  # ✅ Return the best match
-    return None  # ✅ No match found
+    while True:
+        matches = index.search(user_input, k=1, cutoff=0.5)
+        if not matches:
+            return None  # ✅ No match found
+        if matches[0][0] in stored_keys:
+            return matches[0][0]  # ✅ Return the best match
+        # Deleted without forget_key; drop it and look again
+        index.remove(matches[0][0])
 
 def retrieve_value(user, user_input, user_memory):
     """
@@ -35,15 +107,16 @@ def retrieve_value(user, user_input, user_memory):
     standardized_key = get_standardized_key(user_input)  # ✅ Standardize before searching
     standardized_key = clean_query_text(user_input)
 
-    print(f"🔍 DEBUG: Standardized Key - {standardized_key}")
-    print(f"🔍 DEBUG: Stored Keys for {user} - {list(user_memory[user].keys())}")
+    logger.debug("🔍 Standardized Key - %s", standardized_key)
+    logger.debug("🔍 Stored Keys for %s - %d keys", user, len(user_memory[user]))
 
     # ✅ Ensure correct key search
     if standardized_key in user_memory[user]:
         return f"{standardized_key}: {', '.join(user_memory[user][standardized_key])}"
 
     # ✅ Use fuzzy matching if direct lookup fails
-    closest_match = find_closest_key(standardized_key, user_memory[user].keys())
+    stored_keys = user_memory[user].keys()
+    closest_match = find_closest_key(standardized_key, stored_keys, get_fuzzy_index(user, stored_keys))
     if closest_match:
         return f"{closest_match}: {', '.join(user_memory[user][closest_match])}"
 
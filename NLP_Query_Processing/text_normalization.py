@@ -0,0 +1,95 @@
+"""
+Precompiled text normalization used on the request path.
+
+Patterns, the punctuation table and the stopword set are built once at import
+(the stopword set on first use) instead of on every call, and `normalize`
+memoizes its results because the same questions come back constantly.
+"""
+
+import os
+import re
+import string
+from functools import lru_cache
+
+from nlp_resources import get_stopword_list, get_tokenizer
+
+NORMALIZE_CACHE_SIZE = int(os.getenv("NORMALIZE_CACHE_SIZE", "4096"))
+
+PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation)
+
+# preprocess_query
+POSSESSIVE_SUFFIX_PATTERN = re.compile(r"\b(\w+)'s\b")
+
+# extract_key_value
+COMMAND_PATTERN = re.compile(r"@store|@update|@delete")
+STATEMENT_SPLIT_PATTERN = re.compile(r"\s+and\s+")
+KEY_VALUE_PATTERN = re.compile(r"(.*?)(?:is|to|=)\s*(.*)", re.IGNORECASE)
+POSSESSIVE_KEY_PATTERN = re.compile(r"(\w+)'s\s+(.*)")
+
+# extract_key_for_retrieval
+QUESTION_PREFIX_PATTERN = re.compile(r"^(what's|what|tell me|when does|where is|how does|who has|can you|do you know)[\s,]+")
+LEADING_MY_PATTERN = re.compile(r"^my\s+")
+KEY_FILLER_PATTERN = re.compile(r"^(is|my|the)\s+", re.IGNORECASE)
+QUESTION_SPLIT_PATTERN = re.compile(r"\s*,\s*(?:and\s+)?|\s+and\s+|\s*&\s*")
+
+# extract_relation_and_key
+RELATION_KEY_PATTERN = re.compile(r"(?:my\s+)?(\w+)'s\s+(.*)", re.IGNORECASE)
+
+_stopword_set = None
+_tokenize = None
+
+
+def get_stopwords():
+    """
+    Returns the English stopwords as a frozenset, loaded once.
+    """
+    global _stopword_set
+    if _stopword_set is None:
+        _stopword_set = frozenset(get_stopword_list())
+    return _stopword_set
+
+
+def tokenize(text):
+    """
+    Tokenizes with NLTK punkt when vendored, otherwise with a regex tokenizer.
+    """
+    global _tokenize
+    if _tokenize is None:
+        _tokenize = get_tokenizer()
+    return _tokenize(text)
+
+
+def warm_up():
+    """
+    Loads the stopword set and tokenizer up front.
+    """
+    get_stopwords()
+    tokenize("")
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize(query):
+    """
+    Lowercases the query and strips possessives, punctuation and stopwords.
+
+    Args:
+        query (str): The user's input text.
+
+    Returns:
+        str: Processed text with only important words.
+    """
+    query = POSSESSIVE_SUFFIX_PATTERN.sub(r"\1", query)
+    query = query.lower().translate(PUNCTUATION_TABLE)
+    stop = get_stopwords()
+    return " ".join(word for word in tokenize(query) if word not in stop)
+
+
+def normalize_many(queries):
+    """
+    Normalizes a list of queries, working on each distinct query only once.
+
+    Returns:
+        list: Normalized text for every query, in input order.
+    """
+    normalized = {query: normalize(query) for query in dict.fromkeys(queries)}
+    return [normalized[query] for query in queries]
@@ -0,0 +1,186 @@
+"""
+ASGI entry point for the /chat API.
+
+Serves the same routes as app_embeddings.py on top of the async handlers in
+chat_service.py, so thousands of concurrent sessions share a handful of
+threads instead of each holding one:
+
+    - CPU-bound parsing runs in a bounded thread pool (ASYNC_CPU_WORKERS)
+    - embeddings wait on the micro-batcher's futures without blocking a thread
+    - vector store I/O goes through the store's pooled async client
+
+Run with any ASGI server, e.g.:
+
+    cd Setting_up_LLM && uvicorn app_async:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from dotenv import load_dotenv
+
+vectordb_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../Connecting_LLM_VectorDB"))
+sys.path.append(vectordb_path)
+
+monitoring_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../Monitoring"))
+sys.path.append(monitoring_path)
+
+security_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../LLM_Security"))
+sys.path.append(security_path)
+
+from chat_service import handle_chat_async, handle_import_async
+from model_registry import get_vector_store, get_write_buffer, warm_up
+from restrict_search import AUTH_TRUST_BODY_USER, user_from_authorization
+from tracing import metrics, trace
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+ASYNC_CPU_WORKERS = int(os.getenv("ASYNC_CPU_WORKERS", str(os.cpu_count() or 4)))
+MAX_BODY_BYTES = int(os.getenv("MAX_BODY_BYTES", str(10 * 1024 * 1024)))
+
+
+class RequestError(Exception):
+    """
+    A client error, answered with `status` instead of a 500.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+async def _read_body(receive):
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise RequestError("Request body too large", 413)
+        more_body = message.get("more_body", False)
+    return body
+
+
+async def _send_json(send, payload, status=200):
+    # Plain-text payloads (the /metrics page) are sent as-is
+    if isinstance(payload, str):
+        body, content_type = payload.encode(), b"text/plain; version=0.0.4"
+    else:
+        body, content_type = json.dumps(payload).encode(), b"application/json"
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _request_user(scope, claimed_user):
+    # The authenticated user, or (AUTH_TRUST_BODY_USER only) the one named in the request
+    user = scope.get("user_id")
+    if user is not None:
+        return user
+    return claimed_user if AUTH_TRUST_BODY_USER else None
+
+
+async def _chat(scope, body):
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        raise RequestError("Request body is not valid JSON")
+    if not isinstance(data, dict):
+        raise RequestError("Request body must be a JSON object")
+    user, message = data.get("user", ""), data.get("message", "")
+    if not isinstance(user, str) or not isinstance(message, str):
+        raise RequestError("'user' and 'message' must be strings")
+    with trace("chat_request"):
+        return await handle_chat_async(_request_user(scope, user), message)
+
+
+async def _import_memories(scope, body):
+    query = parse_qs(scope.get("query_string", b"").decode())
+    user = _request_user(scope, query.get("user", [""])[0])
+    try:
+        text = body.decode()
+    except UnicodeDecodeError:
+        raise RequestError("Request body must be UTF-8 text")
+    return await handle_import_async(user, text)
+
+
+async def _metrics(scope, body):
+    return metrics.render_prometheus(), 200
+
+
+ROUTES = {
+    ("POST", "/chat"): _chat,
+    ("POST", "/memories/import"): _import_memories,
+    ("GET", "/metrics"): _metrics,
+}
+
+# Routes served without a bearer token
+PUBLIC_ROUTES = {("GET", "/metrics")}
+
+
+def _authenticate(scope):
+    """
+    Sets scope["user_id"] from the bearer token; returns False if the request must be rejected.
+    """
+    headers = dict(scope.get("headers") or [])
+    with trace("authentication"):
+        scope["user_id"] = user_from_authorization(headers.get(b"authorization", b"").decode("latin-1"))
+    return scope["user_id"] is not None or AUTH_TRUST_BODY_USER
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            loop = asyncio.get_running_loop()
+            # Every run_in_executor(None, ...) in the pipeline shares this bounded pool
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=ASYNC_CPU_WORKERS, thread_name_prefix="chat-cpu"))
+            await loop.run_in_executor(None, warm_up)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await asyncio.get_running_loop().run_in_executor(None, get_write_buffer().flush)
+            await get_vector_store().aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """
+    ASGI application callable.
+    """
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    route = (scope["method"], scope["path"])
+    handler = ROUTES.get(route)
+    if handler is None:
+        await _send_json(send, {"error": "Not found"}, 404)
+        return
+    if route not in PUBLIC_ROUTES and not _authenticate(scope):
+        await _send_json(send, {"error": "Unauthorized"}, 401)
+        return
+
+    try:
+        body = await _read_body(receive)
+        payload, status = await handler(scope, body)
+    except RequestError as e:
+        payload, status = {"error": str(e)}, e.status
+    except Exception as e:
+        logger.exception("Error: %s", e)
+        payload, status = {"error": str(e)}, 500
+
+    await _send_json(send, payload, status)
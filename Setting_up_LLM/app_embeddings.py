@@ -1,6 +1,7 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 from dotenv import load_dotenv
 import requests
+import logging
 import os
 import sys
 import re
@@ -12,19 +13,59 @@ sys.path.append(nlp_path)
 vectordb_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../Connecting_LLM_VectorDB"))
 sys.path.append(vectordb_path)
 
-# Import NLP components
-from nlp_processing import preprocess_query, extract_key_value, clean_query_text, build_storage_key, extract_key_for_retrieval
-from crud_operations import detect_intent
+monitoring_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../Monitoring"))
+sys.path.append(monitoring_path)
 
-# Import storage and search logic
-from vectordb import store_text, search_text
+security_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../LLM_Security"))
+sys.path.append(security_path)
+
+# Import the /chat logic shared with the async app
+from chat_service import handle_chat, handle_import
+from model_registry import warm_up
+from restrict_search import AUTH_TRUST_BODY_USER, authenticate_request, token_cache
+from tracing import metrics, trace
 
 # Load environment variables
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+# LOG_LEVEL=DEBUG brings back the per-step debug output
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 
+# Load the embedding model and vector store before the first request instead of on it
+if os.getenv("WARM_UP_ON_START", "").lower() in ("1", "true", "yes"):
+    warm_up()
+
+metrics.register_gauges("token_cache", token_cache.stats)
+
+# Endpoints served without a bearer token
+PUBLIC_ENDPOINTS = {"metrics_endpoint"}
+
+@app.before_request
+def authenticate():
+    """
+    Attaches the bearer token's user id to the request as g.user_id.
+    """
+    if request.endpoint is None or request.endpoint in PUBLIC_ENDPOINTS:
+        return None
+    with trace("authentication"):
+        g.user_id = authenticate_request()
+    if g.user_id is None and not AUTH_TRUST_BODY_USER:
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+def request_user(claimed_user):
+    """
+    Returns the authenticated user, or the user named in the request when
+    AUTH_TRUST_BODY_USER is set and no token was sent.
+    """
+    if g.user_id is not None:
+        return g.user_id
+    return claimed_user if AUTH_TRUST_BODY_USER else None
+
 @app.route("/chat", methods=["POST"])
 def chat():
     """
@@ -32,57 +73,38 @@ def chat():
     """
     try:
         data = request.get_json()
-        raw_input = data.get("message", "").strip()
-        user = data.get("user", "").strip()
-
-        if not raw_input or not user:
-            return jsonify({"error": "Missing message or user"}), 400
-
-        intent = detect_intent(raw_input)
-        print("Intent detected:", intent)
-
-        query = preprocess_query(raw_input)
-        user_input = raw_input  # for clarity
-
-        # ✅ STORE
-        if intent == "store_memory":
-            key_value_pairs = extract_key_value(user_input)
-            if not key_value_pairs:
-                return jsonify({"error": "No valid key-value pair found"}), 400
-
-            formatted_responses = []
-            for key, value, relation in key_value_pairs:
-                cleaned_key = clean_query_text(key)
-                full_key = build_storage_key(cleaned_key, relation)
-                print(f"Storing: '{full_key}' → '{value}' for user: {user}")
-                store_text(user, full_key, value, relation)
-                formatted_responses.append(f"I have stored your {full_key}: {value}.")
-
-            return jsonify({"response": " ".join(formatted_responses)})
-
-        # ✅ RETRIEVE
-        if intent == "retrieve_memory":
-            key, relation = extract_key_for_retrieval(user_input)
-            cleaned_key = clean_query_text(key)
-            full_key = build_storage_key(cleaned_key, relation)
-            readable_key = f"{relation}'s {cleaned_key}" if relation else cleaned_key
-
-            print(f"Searching for: {full_key} for user: {user}")
-            result_text, score = search_text(user, full_key)
-
-            if result_text:
-                return jsonify({
-                    "response": f"Your {readable_key} is {result_text}.",
-                    "score": score
-                })
-            else:
-                return jsonify({"response": "I couldn't find that information."})
-
-        return jsonify({"error": "Unknown intent"}), 400
+        with trace("chat_request"):
+            payload, status = handle_chat(request_user(data.get("user", "")), data.get("message", ""))
+        return jsonify(payload), status
 
     except Exception as e:
-        print("Error:", str(e))
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500
 
+@app.route("/memories/import", methods=["POST"])
+def import_memories():
+    """
+    Bulk-stores facts for one user from a JSONL body.
+
+    Each line is either {"key": ..., "value": ..., "relation": ...} or
+    {"message": "@store my wife's SSN is ..."}. The facts are stored for
+    the authenticated user.
+    """
+    try:
+        payload, status = handle_import(request_user(request.args.get("user", "")), request.get_data(as_text=True))
+        return jsonify(payload), status
+
+    except Exception as e:
+        logger.exception("Error: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """
+    Exposes per-stage latency histograms and cache counters for Prometheus.
+    """
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
+    warm_up()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,389 @@
+"""
+Core /chat and import logic shared by the Flask app (app_embeddings.py) and
+the ASGI app (app_async.py).
+
+Each handler returns a (payload, status) pair so the web layer only has to
+serialise it.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+
+# Add path to NLP and VectorDB modules
+nlp_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../NLP_Query_Processing"))
+sys.path.append(nlp_path)
+
+vectordb_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../Connecting_LLM_VectorDB"))
+sys.path.append(vectordb_path)
+
+monitoring_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../Monitoring"))
+sys.path.append(monitoring_path)
+
+# Import NLP components
+from nlp_processing import (
+    extract_key_value, clean_query_text, build_storage_key, extract_key_for_retrieval, extract_keys_for_retrieval,
+    preprocess_query,
+)
+from crud_operations import detect_intent
+from text_normalization import COMMAND_PATTERN
+
+# Import storage and search logic
+from vectordb import (
+    store_many, search_text, search_many, delete_text, flush_writes, store_many_async, search_text_async,
+    search_many_async, delete_text_async,
+)
+from model_registry import get_response_cache
+from tracing import trace
+
+logger = logging.getLogger(__name__)
+
+# Keys answered per compound question ("my passport number, my SSN and ...")
+MAX_RETRIEVAL_KEYS = int(os.getenv("MAX_RETRIEVAL_KEYS", "10"))
+
+
+def normalize_fact(key, value, relation=None):
+    """
+    Normalizes an extracted fact the same way for /chat and bulk imports.
+
+    Returns:
+        tuple: (full_key, value, relation)
+    """
+    cleaned_key = clean_query_text(key)
+    full_key = build_storage_key(cleaned_key, relation)
+    return full_key, value.strip(), relation
+
+
+def _facts_to_store(user, user_input, verb="stored"):
+    """
+    Extracts and normalizes the facts of a store or update message.
+
+    Returns:
+        tuple: (facts, response text), or (None, None) if nothing was found.
+    """
+    key_value_pairs = extract_key_value(user_input)
+    if not key_value_pairs:
+        return None, None
+
+    formatted_responses = []
+    facts = []
+    for key, value, relation in key_value_pairs:
+        full_key, value, relation = normalize_fact(key, value, relation)
+        logger.debug("Storing: '%s' → '%s' for user: %s", full_key, value, user)
+        facts.append((full_key, value, relation))
+        formatted_responses.append(f"I have {verb} your {full_key}: {value}.")
+
+    return facts, " ".join(formatted_responses)
+
+
+def _target(key, relation):
+    cleaned_key = clean_query_text(key)
+    full_key = build_storage_key(cleaned_key, relation)
+    readable_key = f"{relation}'s {cleaned_key}" if relation else cleaned_key
+    return full_key, readable_key, relation
+
+
+def _retrieval_target(user_input):
+    """
+    Returns (full_key, readable_key, relation) for a retrieval question.
+    """
+    return _target(*extract_key_for_retrieval(user_input))
+
+
+def _retrieval_targets(user_input):
+    """
+    Returns (full_key, readable_key, relation) for every key a retrieval
+    question asks for ("my passport number and my wife's birthday").
+    """
+    targets = [_target(key, relation) for key, relation in extract_keys_for_retrieval(user_input)]
+    return targets[:MAX_RETRIEVAL_KEYS] or [_retrieval_target(user_input)]
+
+
+def _deletion_target(user_input):
+    """
+    Returns (full_key, readable_key, relation) for a delete message.
+    """
+    return _retrieval_target(COMMAND_PATTERN.sub("", user_input).strip())
+
+
+def _cached_answer(user, full_key):
+    """
+    Looks up a cached (value, score) answer for a retrieval key.
+
+    Returns:
+        tuple: (cache key, cached answer or None, generation for _cache_answer)
+    """
+    cache_key = preprocess_query(full_key) or full_key
+    with trace("response_cache"):
+        cached, generation = get_response_cache().get(user, cache_key)
+    return cache_key, cached, generation
+
+
+def _cache_answer(user, cache_key, result_text, score, generation):
+    # Rate-limit errors are not answers
+    if not isinstance(result_text, dict):
+        get_response_cache().put(user, cache_key, [result_text, score], generation)
+
+
+def _retrieval_response(readable_key, result_text, score):
+    # search_text reports rate limiting as ({"error": ...}, 429)
+    if isinstance(result_text, dict):
+        return result_text, score
+
+    if result_text:
+        return {
+            "response": f"Your {readable_key} is {result_text}.",
+            "score": score
+        }, 200
+    return {"response": "I couldn't find that information."}, 200
+
+
+def _cached_answers(user, targets):
+    """
+    Looks up every target in the response cache.
+
+    Returns:
+        tuple: (answers with None for misses, [(index, cache key, generation)] of the misses)
+    """
+    answers, misses = [], []
+    for i, (full_key, _, _) in enumerate(targets):
+        cache_key, cached, generation = _cached_answer(user, full_key)
+        answers.append(tuple(cached) if cached is not None else None)
+        if cached is None:
+            misses.append((i, cache_key, generation))
+    return answers, misses
+
+
+def _merge_answers(user, targets, answers, misses, found):
+    """
+    Fills the misses with search results, caches them and builds one response for every key.
+    """
+    # search_many reports rate limiting as ({"error": ...}, 429)
+    if isinstance(found, tuple):
+        return found
+
+    for (i, cache_key, generation), (result_text, score) in zip(misses, found):
+        _cache_answer(user, cache_key, result_text, score, generation)
+        answers[i] = (result_text, score)
+
+    sentences, items = [], []
+    for (_, readable_key, _), (result_text, score) in zip(targets, answers):
+        sentences.append(f"Your {readable_key} is {result_text}." if result_text else f"I couldn't find your {readable_key}.")
+        items.append({"key": readable_key, "value": result_text, "score": score})
+    return {"response": " ".join(sentences), "answers": items}, 200
+
+
+def _miss_queries(targets, misses):
+    return [(targets[i][0], targets[i][2]) for i, _, _ in misses]
+
+
+def _oldest(misses):
+    # A write may land between the cache lookups; the oldest generation is the safe one
+    return min(generation for _, _, generation in misses)
+
+
+def handle_chat(user, raw_input):
+    """
+    Determines the intent of a message and stores or retrieves info via VectorDB.
+
+    Args:
+        user (str): User identifier.
+        raw_input (str): The user's message.
+
+    Returns:
+        tuple: (response payload, HTTP status)
+    """
+    raw_input = (raw_input or "").strip()
+    user = (user or "").strip()
+    if not raw_input or not user:
+        return {"error": "Missing message or user"}, 400
+
+    with trace("intent_detection"):
+        intent = detect_intent(raw_input)
+    logger.debug("Intent detected: %s", intent)
+
+    # ✅ STORE / UPDATE (ids are per key, so storing a key again overwrites it)
+    if intent in ("store_memory", "update_memory"):
+        with trace("extraction"):
+            facts, response = _facts_to_store(user, raw_input, "stored" if intent == "store_memory" else "updated")
+        if not facts:
+            return {"error": "No valid key-value pair found"}, 400
+
+        # One batched embed and upsert for every fact in the message
+        store_many(user, facts)
+        return {"response": response}, 200
+
+    # ✅ DELETE
+    if intent == "delete_memory":
+        with trace("extraction"):
+            full_key, readable_key, _ = _deletion_target(raw_input)
+        if not full_key:
+            return {"error": "No key found to delete"}, 400
+
+        delete_text(user, full_key)
+        return {"response": f"I have deleted your {readable_key}."}, 200
+
+    # ✅ RETRIEVE
+    if intent == "retrieve_memory":
+        with trace("extraction"):
+            targets = _retrieval_targets(raw_input)
+        if len(targets) > 1:
+            # One batched embed, concurrent vector queries, one merged answer
+            answers, misses = _cached_answers(user, targets)
+            found = search_many(user, _miss_queries(targets, misses), generation=_oldest(misses)) if misses else []
+            return _merge_answers(user, targets, answers, misses, found)
+
+        full_key, readable_key, relation = targets[0]
+        cache_key, cached, generation = _cached_answer(user, full_key)
+        if cached is not None:
+            return _retrieval_response(readable_key, *cached)
+
+        logger.debug("Searching for: %s for user: %s", full_key, user)
+        result_text, score = search_text(user, full_key, relation=relation, generation=generation)
+        _cache_answer(user, cache_key, result_text, score, generation)
+        return _retrieval_response(readable_key, result_text, score)
+
+    return {"error": "Unknown intent"}, 400
+
+
+async def handle_chat_async(user, raw_input):
+    """
+    Async version of handle_chat: parsing runs in the loop's executor and the
+    embedding and vector store calls are awaited.
+    """
+    raw_input = (raw_input or "").strip()
+    user = (user or "").strip()
+    if not raw_input or not user:
+        return {"error": "Missing message or user"}, 400
+
+    loop = asyncio.get_running_loop()
+    with trace("intent_detection"):
+        intent = detect_intent(raw_input)  # a single precompiled regex scan, cheap enough to run inline
+    logger.debug("Intent detected: %s", intent)
+
+    if intent in ("store_memory", "update_memory"):
+        verb = "stored" if intent == "store_memory" else "updated"
+        with trace("extraction"):
+            facts, response = await loop.run_in_executor(None, _facts_to_store, user, raw_input, verb)
+        if not facts:
+            return {"error": "No valid key-value pair found"}, 400
+
+        await store_many_async(user, facts)
+        return {"response": response}, 200
+
+    if intent == "delete_memory":
+        with trace("extraction"):
+            full_key, readable_key, _ = await loop.run_in_executor(None, _deletion_target, raw_input)
+        if not full_key:
+            return {"error": "No key found to delete"}, 400
+
+        await delete_text_async(user, full_key)
+        return {"response": f"I have deleted your {readable_key}."}, 200
+
+    if intent == "retrieve_memory":
+        with trace("extraction"):
+            targets = await loop.run_in_executor(None, _retrieval_targets, raw_input)
+        # The response cache may be a Redis round trip, so it is used from the executor
+        if len(targets) > 1:
+            answers, misses = await loop.run_in_executor(None, _cached_answers, user, targets)
+            found = await search_many_async(user, _miss_queries(targets, misses), generation=_oldest(misses)) if misses else []
+            return await loop.run_in_executor(None, _merge_answers, user, targets, answers, misses, found)
+
+        full_key, readable_key, relation = targets[0]
+        cache_key, cached, generation = await loop.run_in_executor(None, _cached_answer, user, full_key)
+        if cached is not None:
+            return _retrieval_response(readable_key, *cached)
+
+        logger.debug("Searching for: %s for user: %s", full_key, user)
+        result_text, score = await search_text_async(user, full_key, relation=relation, generation=generation)
+        await loop.run_in_executor(None, _cache_answer, user, cache_key, result_text, score, generation)
+        return _retrieval_response(readable_key, result_text, score)
+
+    return {"error": "Unknown intent"}, 400
+
+
+def _import_record_error(record):
+    # Returns why a parsed import line cannot be used, or None
+    if not isinstance(record, dict):
+        return "Expected a JSON object"
+    for field in ("message", "key", "value", "relation"):
+        if record.get(field) is not None and not isinstance(record[field], str):
+            return f"'{field}' must be a string"
+    return None
+
+
+def parse_import(body):
+    """
+    Parses a JSONL import body.
+
+    Each line is either {"key": ..., "value": ..., "relation": ...} or
+    {"message": "@store my wife's SSN is ..."}.
+
+    Returns:
+        tuple: (normalized facts, per-line errors)
+    """
+    facts = []
+    errors = []
+    for line_number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            errors.append({"line": line_number, "error": f"Invalid JSON: {e}"})
+            continue
+
+        error = _import_record_error(record)
+        if error:
+            errors.append({"line": line_number, "error": error})
+            continue
+
+        if record.get("message"):
+            extracted = extract_key_value(record["message"]) or []
+        elif record.get("key") and record.get("value"):
+            extracted = [(record["key"], record["value"], record.get("relation"))]
+        else:
+            extracted = []
+
+        if not extracted:
+            errors.append({"line": line_number, "error": "No valid key-value pair found"})
+            continue
+
+        for key, value, relation in extracted:
+            facts.append(normalize_fact(key, value, relation))
+
+    return facts, errors
+
+
+def handle_import(user, body):
+    """
+    Bulk-stores the facts of a JSONL body for one user.
+
+    Returns:
+        tuple: (response payload, HTTP status)
+    """
+    user = (user or "").strip()
+    if not user:
+        return {"error": "Missing user"}, 400
+
+    facts, errors = parse_import(body)
+    stored = store_many(user, facts) if facts else 0
+    flush_writes()  # Report the import only once it is in the vector store
+    return {"stored": stored, "errors": errors}, 200
+
+
+async def handle_import_async(user, body):
+    """
+    Async version of handle_import.
+    """
+    user = (user or "").strip()
+    if not user:
+        return {"error": "Missing user"}, 400
+
+    loop = asyncio.get_running_loop()
+    facts, errors = await loop.run_in_executor(None, parse_import, body)
+    stored = await store_many_async(user, facts) if facts else 0
+    await loop.run_in_executor(None, flush_writes)
+    return {"stored": stored, "errors": errors}, 200
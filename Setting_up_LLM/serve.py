@@ -0,0 +1,182 @@
+"""
+Production launcher: several gunicorn worker processes sharing one copy of
+the model weights.
+
+The master process loads the embedding model (and spaCy, the stopwords and
+the tokenizer) before forking, then freezes the garbage collector so the
+workers' copy-on-write pages stay shared. Each worker then:
+
+    - drops the clients and threads inherited from the master, so it opens
+      its own vector store connection pool, embedding batcher and write buffer
+    - limits torch (and ONNX Runtime) to TORCH_THREADS_PER_WORKER intra-op
+      threads, so workers x threads does not oversubscribe the cores
+
+ONNX Runtime sessions are not fork-safe, so with EMBEDDING_ENGINE=onnx or
+onnx-int8 the master skips the model and each worker loads its own session
+after forking (with ONNX_INTRA_OP_THREADS threads if set, else the budget).
+
+Configure with:
+
+    SERVE_APP                 flask (app_embeddings, default) or async (app_async)
+    SERVE_BIND                address to listen on (default 0.0.0.0:5000)
+    SERVE_WORKERS             worker processes (default: one per core)
+    SERVE_THREADS             request threads per Flask worker (default 4)
+    TORCH_THREADS_PER_WORKER  torch/ONNX intra-op threads (default: cores / workers, at least 1)
+    SERVE_TIMEOUT             worker timeout in seconds (default 60)
+
+Workers only share state through the configured backends, so more than one
+worker needs VECTOR_STORE_BACKEND=pinecone, RESPONSE_CACHE_BACKEND=redis (or
+off) and RATE_LIMIT_BACKEND=redis. With a local backend the launcher refuses
+to start unless SERVE_WORKERS=1: each worker would rewrite the local vector
+store from its own stale copy, and would keep its own cache and rate limits.
+RESPONSE_CACHE_BACKEND=off also keeps the generations that invalidate the
+exact-key index per worker, so it needs KEY_INDEX_MAX_USERS=0 (index off).
+
+Run with:
+
+    cd Setting_up_LLM && python serve.py
+"""
+
+import gc
+import logging
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+nlp_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../NLP_Query_Processing"))
+sys.path.append(nlp_path)
+
+vectordb_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../Connecting_LLM_VectorDB"))
+sys.path.append(vectordb_path)
+
+import crud_operations
+import model_registry
+import text_normalization
+
+logger = logging.getLogger(__name__)
+
+CPU_COUNT = os.cpu_count() or 1
+
+SERVE_APP = os.getenv("SERVE_APP", "flask").strip().lower()
+SERVE_BIND = os.getenv("SERVE_BIND", "0.0.0.0:5000")
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", str(CPU_COUNT)))
+if SERVE_WORKERS < 1:
+    raise ValueError(f"SERVE_WORKERS must be at least 1, got {SERVE_WORKERS}.")
+SERVE_THREADS = int(os.getenv("SERVE_THREADS", "4"))
+SERVE_TIMEOUT = int(os.getenv("SERVE_TIMEOUT", "60"))
+TORCH_THREADS_PER_WORKER = int(os.getenv("TORCH_THREADS_PER_WORKER", str(max(1, CPU_COUNT // SERVE_WORKERS))))
+# An explicit ONNX_INTRA_OP_THREADS wins; its default (0) would use every core
+ONNX_THREADS_PER_WORKER = int(os.getenv("ONNX_INTRA_OP_THREADS", "0")) or TORCH_THREADS_PER_WORKER
+
+# Backends that keep their state inside one process (or, for the vector
+# store, rewrite shared files from one process's view)
+PROCESS_LOCAL_BACKENDS = {
+    "VECTOR_STORE_BACKEND": ("pinecone", {"local"}),
+    "RESPONSE_CACHE_BACKEND": ("local", {"local"}),
+    "RATE_LIMIT_BACKEND": ("local", {"local"}),
+}
+
+APPS = {
+    "flask": ("app_embeddings:app", "gthread"),
+    "async": ("app_async:app", "uvicorn.workers.UvicornWorker"),
+}
+
+
+def check_backends(workers=SERVE_WORKERS):
+    """
+    Raises ValueError if `workers` processes would each keep their own copy of
+    a backend that must be shared.
+    """
+    if workers <= 1:
+        return
+    local = [
+        name for name, (default, local_values) in PROCESS_LOCAL_BACKENDS.items()
+        if os.getenv(name, default).strip().lower() in local_values
+    ]
+    if local:
+        raise ValueError(
+            f"{', '.join(local)} {'is' if len(local) == 1 else 'are'} local, which cannot be shared by "
+            f"{workers} workers. Use shared backends (pinecone, redis) or set SERVE_WORKERS=1."
+        )
+    cache_off = os.getenv("RESPONSE_CACHE_BACKEND", "local").strip().lower() == "off"
+    if cache_off and int(os.getenv("KEY_INDEX_MAX_USERS", "10000")) > 0:
+        raise ValueError(
+            f"RESPONSE_CACHE_BACKEND=off keeps key index generations per worker, so {workers} workers would "
+            f"serve each other's stale values. Set KEY_INDEX_MAX_USERS=0 or RESPONSE_CACHE_BACKEND=redis."
+        )
+
+
+def preload():
+    """
+    Loads the shared read-only state in the master process, before forking.
+    """
+    model_registry.preload()
+    crud_operations.warm_up()
+    text_normalization.warm_up()
+    # Move everything loaded so far out of the collector's reach, so workers'
+    # GC passes do not write to (and copy) the pages they share
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """
+    gunicorn hook: runs in each worker right after it is forked.
+    """
+    model_registry.reset_after_fork()
+    model_registry.set_engine_threads(ONNX_THREADS_PER_WORKER)
+    try:
+        import torch
+
+        torch.set_num_threads(TORCH_THREADS_PER_WORKER)
+    except ImportError:
+        pass
+    if not model_registry.EMBEDDING_FORK_SAFE:
+        model_registry.get_embedding_model()  # This worker's own ONNX Runtime session
+    logger.info("Worker %s ready (torch threads: %d)", worker.pid, TORCH_THREADS_PER_WORKER)
+
+
+def worker_exit(server, worker):
+    """
+    gunicorn hook: sends the worker's buffered vector store writes before it exits.
+    """
+    model_registry.get_write_buffer().flush()
+
+
+class ChatServer(BaseApplication):
+    """
+    Runs the chat app under gunicorn with the settings above.
+    """
+
+    def __init__(self, app_name=SERVE_APP):
+        if app_name not in APPS:
+            raise ValueError(f"Unknown SERVE_APP '{app_name}'. Use one of: {', '.join(APPS)}.")
+        self.app_uri, self.worker_class = APPS[app_name]
+        check_backends()
+        super().__init__()
+
+    def load_config(self):
+        settings = {
+            "bind": SERVE_BIND,
+            "workers": SERVE_WORKERS,
+            "worker_class": self.worker_class,
+            "timeout": SERVE_TIMEOUT,
+            "preload_app": True,
+            "post_fork": post_fork,
+            "worker_exit": worker_exit,
+        }
+        if self.worker_class == "gthread":
+            settings["threads"] = SERVE_THREADS
+        for key, value in settings.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # preload_app: runs once, in the master
+        module_name, attribute = self.app_uri.split(":")
+        app = getattr(__import__(module_name), attribute)
+        preload()
+        return app
+
+
+if __name__ == "__main__":
+    ChatServer().run()